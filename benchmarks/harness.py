@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmark scripts."""
+import contextlib
+import importlib.util
+import io
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the tools' shared local packages, for a Python that doesn't have them installed
+for package in ("jsonio", "chunkstore"):
+    if str(ROOT / package) not in sys.path:
+        sys.path.append(str(ROOT / package))
+
+
+def load_tool(name: str, path: Path):
+    """Import a tool's entry point from its folder (the folders aren't packages)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(path.parent))
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(path.parent))
+    return module
+
+
+def best_of(fn, repeat: int) -> float:
+    """Best wall time of fn over repeat runs, with the tool's prints swallowed."""
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start_time)
+    return best
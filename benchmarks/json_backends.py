@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Time every tool's JSON-heavy path with orjson and with the stdlib fallback.
+
+Each tool module is loaded from its folder and run once with ``jsonio.orjson``
+left alone and once with it set to ``None``, and the best of ``--repeat`` runs
+is reported. Needs jsonio and orjson installed (plus each tool's own
+dependencies: chunkstore, colorlog, requests, tqdm, Flask).
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from harness import ROOT, best_of, load_tool
+
+import jsonio  # after harness, which puts it on sys.path if needed
+from synth import make_export
+
+
+def scenarios(workdir: Path, export: Path):
+    """Yield (tool, module, callable) for each tool's hot path on the synthetic export."""
+    chunkcreator = load_tool("chunkcreator", ROOT / "chunksplitter" / "chunkcreator.py")
+    yield "chunkcreator", chunkcreator, lambda: chunkcreator.split_json_messages(str(export), chunk_size=3000)
+
+    chunk_dir = workdir / "export_chunks"
+    combiner = load_tool("combiner", ROOT / "tmc-chunk-combiner" / "main.py")
+    yield "tmc-chunk-combiner", combiner, lambda: combiner.combine_jsons(chunk_dir, workdir / "output", False)
+
+    tmc = load_tool("chunk_to_tmc", ROOT / "chunk-to-tmc-bot-data" / "main.py")
+    tmc.input_file = str(export)
+    tmc.output_file = str(workdir / "tmc.json")
+    yield "chunk-to-tmc-bot-data", tmc, tmc.transform_json
+
+    chunkrender = load_tool("chunkrender", ROOT / "chunkrender" / "main.py")
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    first_chunk = sorted(chunk_dir.glob("*.json"))[0]
+    # no attachments in the synthetic export, so this is the load + rewrite of one chunk
+    yield "chunkrender", chunkrender, lambda: chunkrender.process_json_file(first_chunk, conn)
+
+    chunkstore = load_tool("chunkstore", ROOT / "chunkstore" / "main.py")
+    yield "chunkstore", chunkstore, lambda: chunkstore.convert(chunk_dir, workdir / "messages.db")
+
+    # the editor creates its folders relative to the working directory on import
+    app_module = load_tool("session_edit_web", ROOT / "session-edit-web" / "app.py")
+    editor_dir = Path(app_module.EXTRACT_FOLDER) / "bench"
+    editor_dir.mkdir(parents=True, exist_ok=True)
+    for chunk in chunk_dir.glob("*.json"):
+        (editor_dir / chunk.name).write_bytes(chunk.read_bytes())
+    sqlite3.connect(editor_dir / "packed_images.db").close()
+    client = app_module.app.test_client()
+    client.post("/load_recent", json={"folder": "bench"})
+
+    def editor():
+        for _ in range(5):
+            client.post("/navigate", json={"direction": "forward"})
+        client.post("/navigate", json={"direction": "first"})
+
+    yield "session-edit-web", app_module, editor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare orjson and stdlib json across the tools.")
+    parser.add_argument("--messages", "-n", type=int, default=50000, help="Messages in the synthetic export")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend (best is reported)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if jsonio.orjson is None:
+        raise SystemExit("orjson is not importable, nothing to compare")
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        os.chdir(workdir)
+        export = workdir / "export.json"
+        make_export(export, args.messages)
+
+        results = []
+        for tool, module, fn in scenarios(workdir, export):
+            fast, fast_provider = jsonio.orjson, getattr(getattr(module, "app", None), "json", None)
+            fast_time = best_of(fn, args.repeat)
+            jsonio.orjson = None
+            if fast_provider is not None:
+                module.app.json = module.DefaultJSONProvider(module.app)
+            try:
+                stdlib_time = best_of(fn, args.repeat)
+            finally:
+                jsonio.orjson = fast
+                if fast_provider is not None:
+                    module.app.json = fast_provider
+            results.append({"tool": tool, "orjson": fast_time, "stdlib": stdlib_time,
+                            "speedup": stdlib_time / fast_time if fast_time else None})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'tool':<24}{'stdlib':>10}{'orjson':>10}{'speedup':>9}")
+    for r in results:
+        print(f"{r['tool']:<24}{r['stdlib']:>9.4f}s{r['orjson']:>9.4f}s{r['speedup']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
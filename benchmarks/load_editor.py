@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Load test for running editor servers: concurrent navigation and image requests.
+
+Point it at one or more base URLs, e.g. the sync server (gunicorn app:app) and
+the async one (uvicorn asgi:app), and it runs the same load against each in
+turn. Every client opens its own workspace on the uploaded archive, then mixes
+/navigate and /attachment/<id> requests until the time is up. Meanwhile
+``--uploaders`` clients keep re-uploading the archive, which is the load that
+starves image serving on a sync server. Results are written as JSON; a
+summary table goes to stderr.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from harness import ROOT, load_tool
+from synth import make_export, serve_attachments
+
+
+def build_archive(workdir: Path, args) -> Path:
+    """Synthetic export -> chunks -> packed attachments -> zip, like pipeline.py but untimed."""
+    server = serve_attachments()
+    export = workdir / "export.json"
+    make_export(export, args.messages, args.attachment_ratio, args.blob_min, args.blob_max,
+                base_url=f"http://127.0.0.1:{server.server_address[1]}", seed=args.seed)
+    with contextlib.redirect_stdout(sys.stderr):
+        chunkcreator = load_tool("chunkcreator", ROOT / "chunksplitter" / "chunkcreator.py")
+        chunkcreator.split_json_messages(str(export), chunk_size=args.chunk_size)
+        chunk_dir = workdir / "export_chunks"
+        chunkrender = load_tool("chunkrender", ROOT / "chunkrender" / "main.py")
+        conn = chunkrender.init_db(chunk_dir / chunkrender.DB_NAME)
+        for chunk_file in sorted(chunk_dir.glob("*.json")):
+            chunkrender.process_json_file(chunk_file, conn)
+        conn.close()
+        archive = workdir / "load.zip"
+        chunkrender.zip_output(chunk_dir, archive)
+    server.shutdown()
+    return archive
+
+
+class Client:
+    # one keep-alive connection with its own session cookie
+    def __init__(self, base_url: str):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        self.cookie = None
+
+    def request(self, method: str, path: str, body=None, content_type=None):
+        headers = {}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        if content_type:
+            headers["Content-Type"] = content_type
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            res = self.conn.getresponse()
+            data = res.read()
+        except (http.client.HTTPException, OSError):
+            # server closed the keep-alive connection; retry once on a new one
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            self.conn.request(method, path, body=body, headers=headers)
+            res = self.conn.getresponse()
+            data = res.read()
+        cookie = res.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return res.status, data
+
+    def close(self):
+        self.conn.close()
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # kind -> [(seconds, bytes, ok)]
+
+    def add(self, kind: str, seconds: float, size: int, ok: bool):
+        with self.lock:
+            self.samples.setdefault(kind, []).append((seconds, size, ok))
+
+    def summary(self, duration: float) -> dict:
+        out = {}
+        for kind, samples in sorted(self.samples.items()):
+            times = sorted(s for s, _, ok in samples if ok)
+            quantiles = statistics.quantiles(times, n=100) if len(times) > 1 else times * 99
+            out[kind] = {
+                "requests": len(samples),
+                "errors": sum(1 for *_, ok in samples if not ok),
+                "rps": round(len(times) / duration, 2),
+                "p50_ms": round(quantiles[49] * 1000, 2) if times else None,
+                "p95_ms": round(quantiles[94] * 1000, 2) if times else None,
+                "p99_ms": round(quantiles[98] * 1000, 2) if times else None,
+                "mb_per_s": round(sum(n for _, n, ok in samples if ok) / duration / 1e6, 3),
+            }
+        return out
+
+
+def attachment_ids(client: Client, chunks: int) -> list:
+    ids = []
+    for _ in range(chunks):
+        status, data = client.request("POST", "/navigate", {"direction": "forward"})
+        if status != 200:
+            break
+        ids += re.findall(r"db://attachments/([A-Za-z0-9_-]+)", data.decode("utf-8"))
+    return sorted(set(ids))
+
+
+def run_load(base_url: str, archive: Path, args) -> dict:
+    payload = archive.read_bytes()
+    setup = Client(base_url)
+    status, data = setup.request("POST", f"/upload?name={archive.name}", payload, "application/zip")
+    if status != 200:
+        raise SystemExit(f"{base_url}: upload failed with {status}: {data[:200]!r}")
+    ids = attachment_ids(setup, args.scan_chunks)
+    if not ids:
+        raise SystemExit(f"{base_url}: no packed attachments found in the archive")
+    setup.close()
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + args.duration
+
+    def browse(seed):
+        rng = random.Random(seed)
+        client = Client(base_url)
+        client.request("POST", "/load_recent", {"folder": archive.stem})
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            if rng.random() < args.image_ratio:
+                kind = "image"
+                status, data = client.request("GET", f"/attachment/{rng.choice(ids)}")
+            else:
+                kind = "navigate"
+                status, data = client.request("POST", "/navigate",
+                                              {"direction": rng.choice(("forward", "forward", "backward"))})
+            recorder.add(kind, time.perf_counter() - t0, len(data), status == 200)
+        client.close()
+
+    def upload(n):
+        client = Client(base_url)
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            status, _ = client.request("POST", f"/upload?name=load_upload{n}.zip", payload, "application/zip")
+            recorder.add("upload", time.perf_counter() - t0, len(payload), status == 200)
+        client.close()
+
+    threads = [threading.Thread(target=browse, args=(args.seed + i,)) for i in range(args.clients)]
+    threads += [threading.Thread(target=upload, args=(i,)) for i in range(args.uploaders)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.summary(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare editor servers under concurrent browsing load.")
+    parser.add_argument("--url", action="append", required=True,
+                        help="Base URL of a running editor; repeat to compare servers")
+    parser.add_argument("--archive", type=Path, help="Packed archive to upload (default: build a synthetic one)")
+    parser.add_argument("--clients", "-c", type=int, default=16, help="Concurrent browsing clients")
+    parser.add_argument("--uploaders", "-u", type=int, default=1, help="Clients re-uploading the archive meanwhile")
+    parser.add_argument("--duration", "-d", type=float, default=10.0, help="Seconds of load per server")
+    parser.add_argument("--image-ratio", type=float, default=0.8, help="Share of requests that fetch an image")
+    parser.add_argument("--scan-chunks", type=int, default=20, help="Chunks to scan for attachment ids")
+    parser.add_argument("--messages", "-n", type=int, default=20000)
+    parser.add_argument("--chunk-size", "-s", type=int, default=3000)
+    parser.add_argument("--attachment-ratio", "-a", type=float, default=0.05)
+    parser.add_argument("--blob-min", type=int, default=1024)
+    parser.add_argument("--blob-max", type=int, default=262144)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", type=Path, help="Write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = args.archive or build_archive(Path(tmp), args)
+        results = {}
+        for url in args.url:
+            print(f"loading {url} for {args.duration:g}s...", file=sys.stderr)
+            results[url] = run_load(url, archive, args)
+
+    print(f"{'server':<28}{'kind':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'MB/s':>9}{'errors':>8}", file=sys.stderr)
+    for url, kinds in results.items():
+        for kind, r in kinds.items():
+            print(f"{url:<28}{kind:<10}{r['rps']:>9}{r['p50_ms']!s:>9}{r['p95_ms']!s:>9}{r['mb_per_s']:>9}{r['errors']:>8}",
+                  file=sys.stderr)
+
+    report = {
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != "output"},
+        "servers": results,
+    }
+    if args.output:
+        with args.output.open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
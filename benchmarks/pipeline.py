@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark: split, combine, pack attachments and drive the editor routes.
+
+Everything runs on a synthetic export (see synth.py) in a temporary folder.
+Attachments are downloaded from a local HTTP stand-in, so no network is
+needed. Results are written as JSON; pass a previous result file to
+``--compare`` to print the change per scenario.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from harness import ROOT, load_tool
+from synth import make_export, serve_attachments
+
+
+class Timer:
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, fn, **counts):
+        """Time fn once and record its wall time with any extra counters it returns."""
+        start_time = time.perf_counter()
+        extra = fn() or {}
+        seconds = time.perf_counter() - start_time
+        self.results[name] = {"seconds": round(seconds, 6), **counts, **extra}
+        print(f"{name:<16}{seconds:>10.4f}s", file=sys.stderr)
+        return self.results[name]
+
+
+def run_pipeline(workdir: Path, args) -> dict:
+    server = serve_attachments()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    export = workdir / "export.json"
+    attachments = make_export(export, args.messages, args.attachment_ratio, args.blob_min, args.blob_max,
+                              base_url=base_url, seed=args.seed)
+    blob_bytes = sum(att["fileSizeBytes"] for att in attachments)
+    timer = Timer()
+
+    chunkcreator = load_tool("chunkcreator", ROOT / "chunksplitter" / "chunkcreator.py")
+
+    def split():
+        chunkcreator.split_json_messages(str(export), chunk_size=args.chunk_size)
+
+    timer.run("split", split, messages=args.messages, bytes=export.stat().st_size)
+    chunk_dir = workdir / "export_chunks"
+    chunk_files = sorted(chunk_dir.glob("*.json"))
+
+    combiner = load_tool("combiner", ROOT / "tmc-chunk-combiner" / "main.py")
+    timer.run("combine", lambda: combiner.combine_jsons(chunk_dir, workdir / "combined", False),
+              chunks=len(chunk_files))
+
+    # pack rewrites the chunks in place, like chunkrender does on a real export folder
+    chunkrender = load_tool("chunkrender", ROOT / "chunkrender" / "main.py")
+    conn = chunkrender.init_db(chunk_dir / chunkrender.DB_NAME)
+
+    def pack():
+        for chunk_file in chunk_files:
+            chunkrender.process_json_file(chunk_file, conn)
+        conn.close()
+
+    timer.run("pack", pack, attachments=len(attachments), bytes=blob_bytes)
+    archive = workdir / "bench.zip"
+    timer.run("zip", lambda: chunkrender.zip_output(chunk_dir, archive))
+    server.shutdown()
+
+    # the editor creates its folders relative to the working directory on import
+    editor = load_tool("session_edit_web", ROOT / "session-edit-web" / "app.py")
+    client = editor.app.test_client()
+
+    def upload():
+        with archive.open("rb") as f:
+            res = client.post(f"/upload?name={archive.name}", data=f, content_type="application/zip")
+        assert res.status_code == 200, res.get_data(as_text=True)
+        return {"response_bytes": len(res.get_data())}
+
+    timer.run("upload", upload, bytes=archive.stat().st_size)
+
+    def navigate():
+        sizes = 0
+        for _ in range(len(chunk_files)):
+            sizes += len(client.post("/navigate", json={"direction": "forward"}).get_data())
+        client.post("/navigate", json={"direction": "first"})
+        return {"response_bytes": sizes}
+
+    timer.run("navigate", navigate, requests=len(chunk_files) + 1)
+
+    sample = attachments[:args.attachment_sample]
+
+    def fetch_attachments():
+        sizes = 0
+        for att in sample:
+            res = client.get(f"/attachment/{att['id']}")
+            assert res.status_code == 200, att["id"]
+            sizes += len(res.get_data())
+        return {"response_bytes": sizes}
+
+    timer.run("attachment", fetch_attachments, requests=len(sample))
+
+    def fetch_batch():
+        res = client.post("/attachments", json={"ids": [att["id"] for att in sample]})
+        assert res.status_code == 200
+        return {"response_bytes": len(res.get_data())}
+
+    timer.run("attachment_batch", fetch_batch, requests=1, attachments=len(sample))
+
+    marks = {f"{idx}:{mi}": True
+             for idx in range(len(chunk_files))
+             for mi in range(0, args.chunk_size, args.mark_every)}
+    groups = {"assignments": {key: {"id": 1, "name": "bench", "color": "rgb(200,200,200)"}
+                              for key in list(marks)[::2]}}
+    timer.run("save_marked", lambda: {"status": client.post("/save_marked", json={"marks": marks, "groups": groups}).status_code},
+              marks=len(marks))
+    timer.run("export_marked",
+              lambda: {"response_bytes": len(client.post("/export_marked", json={"marks": marks, "groups": groups}).get_data())},
+              marks=len(marks))
+
+    def group_walk():
+        # first call builds the group index from every chunk
+        client.post("/groups/assign", json={"assign": {"group": {"id": 1, "name": "bench"},
+                                                       "keys": list(groups["assignments"])}})
+        position, hops = "0:-1", 0
+        while True:
+            position = client.get(f"/groups/next?from={position}").get_json()["position"]
+            if position is None:
+                return {"hops": hops}
+            hops += 1
+
+    timer.run("group_walk", group_walk)
+    return timer.results
+
+
+def compare(results: dict, previous_path: Path) -> None:
+    with previous_path.open("r", encoding="utf-8") as f:
+        previous = json.load(f)["scenarios"]
+    print(f"{'scenario':<16}{'before':>10}{'after':>10}{'change':>9}", file=sys.stderr)
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        before, after = previous[name]["seconds"], result["seconds"]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<16}{before:>9.4f}s{after:>9.4f}s{change:>+8.1f}%", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the whole export pipeline on synthetic data.")
+    parser.add_argument("--messages", "-n", type=int, default=20000)
+    parser.add_argument("--chunk-size", "-s", type=int, default=3000)
+    parser.add_argument("--attachment-ratio", "-a", type=float, default=0.05)
+    parser.add_argument("--blob-min", type=int, default=1024)
+    parser.add_argument("--blob-max", type=int, default=65536)
+    parser.add_argument("--attachment-sample", type=int, default=300,
+                        help="How many attachments to fetch through /attachment")
+    parser.add_argument("--mark-every", type=int, default=10, help="Mark every n-th message")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", type=Path, help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", type=Path, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            # the tools print progress; keep stdout for the results JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                scenarios = run_pipeline(Path(tmp), args)
+        finally:
+            os.chdir(cwd)
+
+    try:
+        import orjson  # noqa: F401
+        has_orjson = True
+    except ImportError:
+        has_orjson = False
+
+    report = {
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "orjson": has_orjson,
+        },
+        "scenarios": scenarios,
+    }
+    if args.compare:
+        compare(scenarios, args.compare)
+    if args.output:
+        with args.output.open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Deterministic DiscordChatExporter-shaped exports and matching attachment payloads.
+
+The same seed and options always give the same export, and an attachment's
+bytes depend only on its id and size, so ``serve_attachments`` can answer
+the download URLs in the export without storing anything.
+"""
+import argparse
+import http.server
+import json
+import random
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+WORDS = ["hello", "wörld", "> quote", "ok", "😀", "https://example.com", "lol", "\"quoted\"", "the", "and"]
+IMAGE_TYPES = [("png", 0.6), ("jpg", 0.3), ("gif", 0.1)]
+
+
+def make_export(
+    path: Path,
+    messages: int,
+    attachment_ratio: float = 0.0,
+    blob_min: int = 1024,
+    blob_max: int = 65536,
+    authors: int = 20,
+    base_url: str = "http://127.0.0.1:8000",
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """Write an export to path and return the attachment objects it references."""
+    rng = random.Random(seed)
+    people = [{"id": str(100 + i), "name": f"user{i}", "nickname": f"Nützer {i}",
+               "roles": [{"id": str(i), "name": "role"}]} for i in range(authors)]
+    exts, weights = zip(*IMAGE_TYPES)
+    data: Dict[str, Any] = {
+        "guild": {"id": "1", "name": "Guild"},
+        "channel": {"id": "2", "type": "GuildTextChat", "name": "général"},
+        "messages": [],
+    }
+    all_attachments = []
+    for i in range(messages):
+        attachments = []
+        if rng.random() < attachment_ratio:
+            for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                att_id = str(9 * 10**17 + len(all_attachments))
+                size = rng.randint(blob_min, blob_max)
+                file_name = f"image{len(all_attachments)}.{rng.choices(exts, weights)[0]}"
+                att = {
+                    "id": att_id,
+                    "url": f"{base_url}/blob/{att_id}/{size}/{file_name}",
+                    "fileName": file_name,
+                    "fileSizeBytes": size,
+                }
+                attachments.append(att)
+                all_attachments.append(att)
+        data["messages"].append({
+            "id": str(10**17 + i),
+            "type": "Default",
+            "timestamp": f"2024-01-{1 + i // 86400 % 28:02d}T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}+00:00",
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30))),
+            "author": rng.choice(people),
+            "attachments": attachments,
+            "embeds": [{"title": "embed", "description": "x" * rng.randint(0, 200)}] if i % 10 == 0 else [],
+            "reactions": [{"emoji": {"name": "👍"}, "count": rng.randint(1, 9)}] if i % 4 == 0 else [],
+            "mentions": [],
+        })
+    with Path(path).open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return all_attachments
+
+
+def blob_bytes(att_id: str, size: int) -> bytes:
+    """Payload for an attachment; depends only on its id and size."""
+    return random.Random(att_id).randbytes(size)
+
+
+class BlobHandler(http.server.BaseHTTPRequestHandler):
+    # GET /blob/<id>/<size>/<fileName>
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "blob" or not parts[2].isdigit():
+            self.send_error(404)
+            return
+        body = blob_bytes(parts[1], int(parts[2]))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_attachments(port: int = 0) -> http.server.ThreadingHTTPServer:
+    """Start the attachment stand-in on a background thread; server_address has the real port."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), BlobHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic DiscordChatExporter export.")
+    parser.add_argument("output", help="Export file to write")
+    parser.add_argument("--messages", "-n", type=int, default=10000)
+    parser.add_argument("--attachment-ratio", "-a", type=float, default=0.1,
+                        help="Fraction of messages with attachments")
+    parser.add_argument("--blob-min", type=int, default=1024, help="Smallest attachment in bytes")
+    parser.add_argument("--blob-max", type=int, default=65536, help="Largest attachment in bytes")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Attachment URL prefix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="Serve the attachment payloads on this port after writing")
+    args = parser.parse_args()
+
+    attachments = make_export(Path(args.output), args.messages, args.attachment_ratio, args.blob_min,
+                              args.blob_max, base_url=args.base_url, seed=args.seed)
+    print(f"Wrote {args.messages} messages with {len(attachments)} attachments to '{args.output}'.")
+    if args.serve is not None:
+        server = serve_attachments(args.serve)
+        print(f"Serving attachments on http://127.0.0.1:{server.server_address[1]}, Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import json
+from jsonio import dumps_json, loads_json
 
 # Input and output file paths
 input_file = "specialjson.json"
@@ -6,8 +6,8 @@ output_file = "m2k0.json"
 
 def transform_json():
     # Read the original JSON
-    with open(input_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(input_file, "rb") as f:
+        data = loads_json(f.read())
 
     # Extract just the name and content
     simplified = []
@@ -20,8 +20,8 @@ def transform_json():
         })
 
     # Write the simplified JSON
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(simplified, f, indent=2, ensure_ascii=False)
+    with open(output_file, "wb") as f:
+        f.write(dumps_json(simplified, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
     transform_json()
@@ -1,16 +1,20 @@
 import os
-import json
 import argparse
 import sqlite3
 import requests
 import hashlib
 import mimetypes
+import threading
 from pathlib import Path
 from zipfile import ZipFile
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from jsonio import dumps_json, loads_json
+
 DB_NAME = 'packed_images.db'
+# the download threads share one connection
+db_lock = threading.Lock()
 
 
 def init_db(db_path):
@@ -48,9 +52,10 @@ def download_and_store_attachment(attachment, conn, skip_hash=False, skip_size_c
     if not url or not file_id:
         raise ValueError("Missing 'url' or 'id' in attachment")
 
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM attachments WHERE id = ?", (file_id,))
-    exists = cursor.fetchone()
+    with db_lock:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM attachments WHERE id = ?", (file_id,))
+        exists = cursor.fetchone()
 
     if exists:
         if print_progress:
@@ -91,11 +96,12 @@ def download_and_store_attachment(attachment, conn, skip_hash=False, skip_size_c
     sha256_hash = compute_sha256(content) if not skip_hash else None
     mime_type = get_mime_type(file_name)
 
-    cursor.execute('''
-        INSERT INTO attachments (id, file_name, file_size, mime_type, sha256, data)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (file_id, file_name, file_size, mime_type, sha256_hash, content))
-    conn.commit()
+    with db_lock:
+        cursor.execute('''
+            INSERT INTO attachments (id, file_name, file_size, mime_type, sha256, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (file_id, file_name, file_size, mime_type, sha256_hash, content))
+        conn.commit()
 
     if print_progress:
         print(f"Stored: {file_id}, Size: {len(content)} bytes, MIME: {mime_type}")
@@ -120,8 +126,8 @@ def process_attachments_parallel(attachments, conn, skip_hash=False, skip_size_c
     return results
 
 def process_json_file(json_path, conn, skip_hash=False, skip_size_check=False, print_progress=False):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(json_path, 'rb') as f:
+        data = loads_json(f.read())
 
     if "messages" not in data:
         return
@@ -140,8 +146,8 @@ def process_json_file(json_path, conn, skip_hash=False, skip_size_check=False, p
             except Exception as e:
                 raise RuntimeError(f"Failed to process message attachments in {json_path}: {e}")
 
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    with open(json_path, 'wb') as f:
+        f.write(dumps_json(data, indent=2))
 
 def zip_output(folder_path, output_path):
     with ZipFile(output_path, 'w') as zipf:
@@ -1,19 +1,28 @@
 import os
-import json
+import sys
+import glob
 import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from math import ceil
 from typing import Any
 
-def split_json_messages(file_path: str, chunk_size: int = 3000) -> None:
+from jsonio import dumps_json, loads_json
+
+# Rough ratio of Python object memory to JSON file size while an export is parsed
+PARSE_MEMORY_FACTOR = 8
+
+
+def split_json_messages(file_path: str, chunk_size: int = 3000) -> dict[str, Any] | None:
     start_time = time.perf_counter()
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data: dict[str, Any] = json.load(f)
+    with open(file_path, 'rb') as f:
+        data: dict[str, Any] = loads_json(f.read())
 
     messages = data.get("messages")
     if messages is None or not isinstance(messages, list):
-        print("The JSON does not contain a valid 'messages' list.")
-        return
+        print(f"{file_path}: the JSON does not contain a valid 'messages' list.")
+        return None
 
     total_messages = len(messages)
     chunks_count = ceil(total_messages / chunk_size)
@@ -24,6 +33,7 @@ def split_json_messages(file_path: str, chunk_size: int = 3000) -> None:
     os.makedirs(chunk_dir, exist_ok=True)
 
     chunk_base = {k: v for k, v in data.items() if k != "messages"}
+    chunk_files = []
 
     for i in range(chunks_count):
         start = i * chunk_size
@@ -36,16 +46,117 @@ def split_json_messages(file_path: str, chunk_size: int = 3000) -> None:
 
         chunk_file_path = os.path.join(chunk_dir, f"{base_name}_part{i+1}.json")
 
-        with open(chunk_file_path, 'w', encoding='utf-8') as chunk_file:
-            json.dump(chunk_data, chunk_file, ensure_ascii=False, indent=2)
+        with open(chunk_file_path, 'wb') as chunk_file:
+            chunk_file.write(dumps_json(chunk_data, ensure_ascii=False, indent=2))
+        chunk_files.append({"file": os.path.basename(chunk_file_path), "messageCount": len(chunk_messages)})
 
     end_time = time.perf_counter()
     print(f"Saved {chunks_count} chunk files to '{chunk_dir}'.")
     print(f"Chunk creation took {end_time - start_time:.4f} seconds.")
 
-# Example usage:
+    return {
+        "source": file_path,
+        "chunk_dir": chunk_dir,
+        "messageCount": total_messages,
+        "chunks": chunk_files,
+    }
+
+
+def collect_export_files(inputs: list[str], exclude: tuple[str, ...] = ()) -> list[str]:
+    # Each input may be a DiscordChatExporter file, a directory of them, or a glob.
+    # exclude: files that are never exports, like the manifest of a previous run
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(os.path.join(item, f) for f in sorted(os.listdir(item)) if f.endswith(".json"))
+        elif os.path.isfile(item):
+            files.append(item)
+        else:
+            files.extend(sorted(glob.glob(item)))
+    excluded = {os.path.abspath(path) for path in exclude}
+    # keep order, drop duplicates
+    return [f for f in dict.fromkeys(files) if os.path.abspath(f) not in excluded]
+
+
+def split_many(file_paths: list[str], chunk_size: int = 3000, workers: int | None = None,
+               memory_budget_mb: int = 4096) -> list[dict[str, Any]]:
+    # Split several exports across a process pool. A file is only submitted while
+    # the estimated parse memory of all files in flight stays under the budget, so
+    # several huge exports are never loaded at the same time.
+    budget = memory_budget_mb * 1024 * 1024
+    workers = workers or os.cpu_count() or 1
+    costs = {path: os.path.getsize(path) * PARSE_MEMORY_FACTOR for path in file_paths}
+    pending = sorted(file_paths, key=costs.get, reverse=True)
+    results = []
+    in_flight = {}
+    reserved = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers:
+                # largest file that fits; one bigger than the whole budget still runs, but alone
+                path = next((p for p in pending if not in_flight or reserved + costs[p] <= budget), None)
+                if path is None:
+                    break
+                pending.remove(path)
+                in_flight[executor.submit(split_json_messages, path, chunk_size)] = path
+                reserved += costs[path]
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                reserved -= costs[path]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to split {path}: {e}")
+                    continue
+                if result is not None:
+                    results.append(result)
+
+    # manifest order follows the input order, not completion order
+    order = {path: i for i, path in enumerate(file_paths)}
+    results.sort(key=lambda r: order[r["source"]])
+    return results
+
+
+def write_manifest(results: list[dict[str, Any]], manifest_path: str, chunk_size: int) -> None:
+    manifest = {
+        "chunkSize": chunk_size,
+        "exportCount": len(results),
+        "messageCount": sum(r["messageCount"] for r in results),
+        "exports": results,
+    }
+    with open(manifest_path, 'wb') as f:
+        f.write(dumps_json(manifest, ensure_ascii=False, indent=2))
+    print(f"Wrote manifest for {len(results)} exports to '{manifest_path}'.")
+
+
 if __name__ == "__main__":
-    chunk_size = input("Chunk size: ")
-    export_path = input("Export path: ")
-    split_json_messages(file_path=export_path, chunk_size=int(chunk_size))
+    if len(sys.argv) == 1:
+        # Interactive usage, as before
+        chunk_size = input("Chunk size: ")
+        export_path = input("Export path: ")
+        split_json_messages(file_path=export_path, chunk_size=int(chunk_size))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Split DiscordChatExporter JSON files into chunks.")
+    parser.add_argument("inputs", nargs="+", help="Export files, directories of exports, or glob patterns")
+    parser.add_argument("--chunk-size", "-s", type=int, default=3000, help="Messages per chunk")
+    parser.add_argument("--workers", "-j", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--memory-budget", "-m", type=int, default=4096,
+                        help="Approximate MB of parsed JSON allowed in memory at once")
+    parser.add_argument("--manifest", default="chunk_manifest.json", help="Combined manifest output path")
+    args = parser.parse_args()
+
+    export_files = collect_export_files(args.inputs, exclude=(args.manifest,))
+    if not export_files:
+        print("No export files found.")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    results = split_many(export_files, chunk_size=args.chunk_size, workers=args.workers,
+                         memory_budget_mb=args.memory_budget)
+    write_manifest(results, args.manifest, args.chunk_size)
+    print(f"Split {len(results)}/{len(export_files)} exports in {time.perf_counter() - start_time:.4f} seconds.")
 
@@ -0,0 +1,191 @@
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from jsonio import dumps_json, loads_json
+
+DB_NAME = "messages.db"
+
+# Columns that can be projected from the messages table
+COLUMNS = (
+    "id",
+    "chunk_index",
+    "chunk_file",
+    "position",
+    "timestamp",
+    "author_id",
+    "author_name",
+    "author_nickname",
+    "content",
+    "attachment_ids",
+    "attachment_count",
+    "raw",
+)
+
+
+def init_db(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS chunks (
+            chunk_index INTEGER PRIMARY KEY,
+            file_name TEXT,
+            header TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT,
+            chunk_index INTEGER,
+            chunk_file TEXT,
+            position INTEGER,
+            timestamp TEXT,
+            author_id TEXT,
+            author_name TEXT,
+            author_nickname TEXT,
+            content TEXT,
+            attachment_ids TEXT,
+            attachment_count INTEGER,
+            raw TEXT,
+            PRIMARY KEY (chunk_index, position)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_author ON messages (author_name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_attachments ON messages (attachment_count)")
+    conn.commit()
+    return conn
+
+
+def sort_chunk_files(files: List[Path]) -> List[Path]:
+    """Sort chunk files by the last number in their name, like the editor does."""
+    def keyfn(p: Path):
+        match = re.findall(r"(\d+)", p.name)
+        return (int(match[-1]) if match else 0, p.name)
+
+    return sorted(files, key=keyfn)
+
+
+def attachment_id(att: Any) -> str:
+    """Return the attachment id for a packed ref ("db://attachments/<id>") or an exporter object."""
+    if isinstance(att, dict):
+        return str(att.get("id") or "")
+    s = str(att or "")
+    if s.startswith("db://"):
+        s = s[5:]
+    if s.startswith("attachments/"):
+        s = s.split("/", 1)[1]
+    return s
+
+
+def message_row(msg: Dict[str, Any], chunk_index: int, chunk_file: str, position: int) -> tuple:
+    author = msg.get("author") or {}
+    attachment_ids = [a for a in (attachment_id(att) for att in msg.get("attachments") or []) if a]
+    return (
+        msg.get("id"),
+        chunk_index,
+        chunk_file,
+        position,
+        msg.get("timestamp"),
+        author.get("id"),
+        author.get("name"),
+        author.get("nickname"),
+        msg.get("content"),
+        dumps_json(attachment_ids, ensure_ascii=False, separators=(",", ":")).decode("utf-8"),
+        len(attachment_ids),
+        dumps_json(msg, ensure_ascii=False, separators=(",", ":")).decode("utf-8"),
+    )
+
+
+def convert(export_path: Path, db_path: Optional[Path] = None) -> Path:
+    """Load every chunk in export_path into a messages table next to packed_images.db."""
+    db_path = db_path or export_path / DB_NAME
+    if db_path.exists():
+        db_path.unlink()
+    conn = init_db(db_path)
+    c = conn.cursor()
+
+    total = 0
+    for chunk_index, chunk_file in enumerate(sort_chunk_files(list(export_path.glob("*.json")))):
+        with chunk_file.open("rb") as f:
+            data: Dict[str, Any] = loads_json(f.read())
+        messages = data.get("messages") or []
+        header = {k: v for k, v in data.items() if k not in ("messages", "messageCount")}
+        c.execute("INSERT INTO chunks VALUES (?, ?, ?)",
+                  (chunk_index, chunk_file.name, dumps_json(header, ensure_ascii=False).decode("utf-8")))
+        c.executemany(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (message_row(msg, chunk_index, chunk_file.name, mi)
+             for mi, msg in enumerate(messages) if isinstance(msg, dict)),
+        )
+        total += len(messages)
+
+    conn.commit()
+    conn.close()
+    print(f"Stored {total} messages in '{db_path}'.")
+    return db_path
+
+
+class MessageStore:
+    """Read-only view of a messages.db with column projection and filter pushdown."""
+
+    def __init__(self, db_path: Path):
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def query(
+        self,
+        columns: Optional[List[str]] = None,
+        author: Optional[str] = None,
+        has_attachments: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        chunk_index: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield messages in archive order, reading only the requested columns."""
+        columns = list(columns or ("id", "timestamp", "author_name", "content"))
+        unknown = [col for col in columns if col not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+        where, params = [], []
+        if author is not None:
+            where.append("author_name = ?")
+            params.append(author)
+        if has_attachments is not None:
+            where.append("attachment_count > 0" if has_attachments else "attachment_count = 0")
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(until)
+        if chunk_index is not None:
+            where.append("chunk_index = ?")
+            params.append(chunk_index)
+
+        sql = f"SELECT {', '.join(columns)} FROM messages"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY chunk_index, position"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        for row in self.conn.execute(sql, params):
+            item = dict(row)
+            if "attachment_ids" in item:
+                item["attachment_ids"] = loads_json(item["attachment_ids"])
+            if "raw" in item:
+                item["raw"] = loads_json(item["raw"])
+            yield item
+
+    def author_counts(self) -> Dict[str, int]:
+        rows = self.conn.execute(
+            "SELECT author_name, COUNT(*) FROM messages GROUP BY author_name ORDER BY COUNT(*) DESC")
+        return {name: count for name, count in rows}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from chunkstore import DB_NAME, MessageStore, convert, loads_json, sort_chunk_files
+
+
+def bench(export_path: Path, repeat: int = 3) -> None:
+    """Compare full-scan and filtered queries against the JSON chunks and messages.db."""
+    db_path = export_path / DB_NAME
+    if not db_path.exists():
+        convert(export_path, db_path)
+    chunk_files = sort_chunk_files(list(export_path.glob("*.json")))
+
+    def json_author_counts():
+        counts: Counter = Counter()
+        for chunk_file in chunk_files:
+            with chunk_file.open("rb") as f:
+                for msg in loads_json(f.read()).get("messages", []):
+                    counts[(msg.get("author") or {}).get("name")] += 1
+        return dict(counts)
+
+    def json_with_attachments():
+        found = []
+        for chunk_file in chunk_files:
+            with chunk_file.open("rb") as f:
+                for msg in loads_json(f.read()).get("messages", []):
+                    if msg.get("attachments"):
+                        found.append(msg.get("id"))
+        return found
+
+    store = MessageStore(db_path)
+    scenarios = [
+        ("full scan: messages per author", json_author_counts, store.author_counts),
+        ("filtered: messages with attachments", json_with_attachments,
+         lambda: [row["id"] for row in store.query(columns=["id"], has_attachments=True)]),
+    ]
+
+    print(f"{len(chunk_files)} chunks, {sum(store.author_counts().values())} messages")
+    for name, json_fn, store_fn in scenarios:
+        timings = {}
+        for label, fn in (("json", json_fn), ("sqlite", store_fn)):
+            best = float("inf")
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start_time)
+            timings[label] = best
+        speedup = timings["json"] / timings["sqlite"] if timings["sqlite"] else float("inf")
+        print(f"{name}: json {timings['json']:.4f}s, sqlite {timings['sqlite']:.4f}s ({speedup:.1f}x)")
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store chunked exports in an SQLite message table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_convert = sub.add_parser("convert", help="Build messages.db from the JSON chunks in a folder")
+    p_convert.add_argument("export_path", help="Folder containing JSON chunks (and packed_images.db)")
+
+    p_query = sub.add_parser("query", help="Query a messages.db")
+    p_query.add_argument("db_path", help="Path to messages.db")
+    p_query.add_argument("--columns", "-c", default="id,timestamp,author_name,content",
+                         help="Comma separated list of columns to read")
+    p_query.add_argument("--author", "-a", help="Only messages by this author name")
+    p_query.add_argument("--has-attachments", action="store_true", help="Only messages with attachments")
+    p_query.add_argument("--since", help="Only messages at or after this ISO timestamp")
+    p_query.add_argument("--until", help="Only messages before this ISO timestamp")
+    p_query.add_argument("--limit", "-n", type=int, help="Maximum number of rows")
+
+    p_bench = sub.add_parser("bench", help="Benchmark JSON chunk scans against messages.db")
+    p_bench.add_argument("export_path", help="Folder containing JSON chunks")
+    p_bench.add_argument("--repeat", type=int, default=3, help="Runs per scenario (best is reported)")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        export_path = Path(args.export_path)
+        if not export_path.exists():
+            print("Export path does not exist.")
+            return
+        convert(export_path)
+    elif args.command == "query":
+        store = MessageStore(Path(args.db_path))
+        rows = store.query(
+            columns=[col.strip() for col in args.columns.split(",") if col.strip()],
+            author=args.author,
+            has_attachments=True if args.has_attachments else None,
+            since=args.since,
+            until=args.until,
+            limit=args.limit,
+        )
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        store.close()
+    elif args.command == "bench":
+        bench(Path(args.export_path), repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# JSON I/O shared by the tools: orjson when it's installed (the "fast" extra),
+# the stdlib otherwise, with the same bytes either way.
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads_json(data: str | bytes) -> Any:
+    # orjson when installed; anything it refuses (NaN, huge ints, a BOM) goes to the stdlib
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _plain_float(value: float) -> bool:
+    # floats both write the same way: the stdlib switches to exponent notation
+    # below 1e-4 and from 1e16 on, as 1e-07 and 1e+16 where orjson writes 1e-7
+    # and 1e16. NaN and +-Infinity (null in orjson) fail the comparison too.
+    return value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def has_odd_floats(obj: Any) -> bool:
+    # Whether orjson would write a float in obj differently from the stdlib.
+    # The stdlib fallback above can return NaN/Infinity, and a chunk read that
+    # way has to be written back unchanged.
+    if type(obj) is float:
+        return not _plain_float(obj)
+    stack = [obj] if type(obj) in (dict, list, tuple) else []
+    while stack:
+        item = stack.pop()
+        for value in (item.values() if type(item) is dict else item):
+            kind = type(value)
+            if kind is dict or kind is list or kind is tuple:
+                stack.append(value)
+            elif kind is float and not _plain_float(value):
+                return True
+    return False
+
+
+def dumps_json(obj: Any, indent: int | None = None, ensure_ascii: bool = True,
+               separators: tuple[str, str] | None = None) -> bytes:
+    # Same bytes as json.dumps(...).encode(); orjson is only used where its output is identical
+    if orjson is not None and not ensure_ascii:
+        option = None
+        if indent == 2:
+            option = orjson.OPT_INDENT_2
+        elif indent is None and separators == (",", ":"):
+            option = 0
+        if option is not None and not has_odd_floats(obj):
+            try:
+                return orjson.dumps(obj, option=option)
+            except TypeError:
+                pass
+    return json.dumps(obj, indent=indent, ensure_ascii=ensure_ascii, separators=separators).encode("utf-8")
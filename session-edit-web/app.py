@@ -6,20 +6,67 @@ import shutil
 import sqlite3
 import zipfile
 import re
+import secrets
+import struct
+import threading
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, session, abort
+from flask import Flask, Response, render_template, request, jsonify, send_file, session, abort
+from flask.json.provider import DefaultJSONProvider
+
+from jsonio import dumps_json, loads_json, orjson
+
+import metrics
+import extraction
+from groups import GroupIndex, drop_pending
+from workspaces import WorkspaceRegistry
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # jsonify through orjson; keys stay sorted like Flask's default provider. Unlike
+    # dumps_json, NaN/Infinity come out as null, which the browser's JSON.parse accepts.
+    option = 0
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return loads_json(s)
+
 
 app = Flask(__name__)
+if orjson is not None:
+    OrjsonProvider.option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    app.json = OrjsonProvider(app)
 app.secret_key = "supersecretkey"
+metrics.init_app(app)
 
 UPLOAD_FOLDER = "uploads"
 EXTRACT_FOLDER = "extracted"
 SAVE_FOLDER = "saved"
+WORKSPACE_DB = "workspaces.db"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(EXTRACT_FOLDER, exist_ok=True)
 os.makedirs(SAVE_FOLDER, exist_ok=True)
 logging.basicConfig(level=logging.INFO)
 
+# chunk lists, DB handles and caches live server side; the cookie only holds the workspace id
+workspaces = WorkspaceRegistry(WORKSPACE_DB)
+
+
+def current_workspace():
+    return workspaces.get(session.get("workspace"))
+
+
+def open_workspace(extract_path, json_files, reextracted=False):
+    ws = workspaces.create(extract_path, json_files, reextracted)
+    session.clear()
+    session["workspace"] = ws.id
+    return ws
+
 
 @app.route("/")
 def index():
@@ -33,10 +80,11 @@ def favicon():
 
 
 def sort_json_files(files):
-    # Sort by the first integer found in filename; if none, fall back to filename
+    # Sort by the last integer found in filename (the chunk number); if none, fall back to filename.
+    # Done once when an archive is opened; navigation never re-sorts.
     def keyfn(f):
-        m = re.search(r'(\d+)', f)
-        return (int(m.group(1)), f) if m else (float('inf'), f)
+        m = re.findall(r'(\d+)', f)
+        return (int(m[-1]), f) if m else (0, f)
 
     return sorted(files, key=keyfn)
 
@@ -44,26 +92,41 @@ def sort_json_files(files):
 # --- ensure upload returns json_files list
 @app.route("/upload", methods=["POST"])
 def upload():
-    file = request.files.get("file")
-    if not file or not file.filename.endswith(".zip"):
+    # The archive is either the raw request body (?name=<file>.zip) or a multipart "file" field.
+    # Either way it is copied to disk in blocks, never held in memory.
+    if request.mimetype == "multipart/form-data":
+        file = request.files.get("file")
+        filename, stream = (file.filename, file.stream) if file else ("", None)
+    else:
+        filename, stream = request.args.get("name", ""), request.stream
+    filename = os.path.basename(filename)
+    if stream is None or not filename.endswith(".zip"):
         return jsonify({"error": "Invalid file format"}), 400
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(filepath)
-    extract_path = os.path.join(EXTRACT_FOLDER, os.path.splitext(file.filename)[0])
-    if os.path.exists(extract_path):
-        shutil.rmtree(extract_path)
-    with zipfile.ZipFile(filepath, 'r') as z:
-        z.extractall(extract_path)
-    json_files = [f for f in os.listdir(extract_path) if f.endswith(".json")]
-    json_files = sort_json_files(json_files)
-    db_files = [f for f in os.listdir(extract_path) if f.endswith(".db")]
-    if not json_files or "packed_images.db" not in db_files:
+    # saved under a name of its own: a second upload of the same file must not replace
+    # the archive an earlier extraction is still reading. Once extracted it becomes
+    # uploads/<name>, where the last upload of a name wins.
+    filepath = os.path.join(UPLOAD_FOLDER, f".{secrets.token_hex(8)}-{filename}")
+    with metrics.span("save"):
+        size = extraction.save_stream(stream, filepath)
+    metrics.add_write(size)
+    extract_path = os.path.join(EXTRACT_FOLDER, os.path.splitext(filename)[0])
+    try:
+        job = extraction.Extraction(filepath, extract_path, keep_as=os.path.join(UPLOAD_FOLDER, filename))
+    except zipfile.BadZipFile:
+        os.remove(filepath)
+        return jsonify({"error": "Invalid archive: not a zip file"}), 400
+    top_level = job.top_level_files()
+    json_files = sort_json_files([f for f in top_level if f.endswith(".json")])
+    if not json_files or "packed_images.db" not in top_level:
+        os.remove(filepath)
         return jsonify({"error": "Invalid archive: needs .json files and packed_images.db"}), 400
-    session["json_files"] = json_files
-    session["extract_path"] = extract_path
-    session["current_index"] = 0
-    session["file_count"] = len(json_files)
-    data = load_chunk(0)
+    # the DB and the first chunk are written before responding; the rest is extracted
+    # in the background and routes wait for a chunk only if it isn't on disk yet
+    with metrics.span("extract"):
+        job.start(priority=("packed_images.db", json_files[0]))
+    metrics.add_read(size)
+    ws = open_workspace(extract_path, json_files, reextracted=True)
+    data = load_chunk(ws, 0)
     return jsonify({
         "message": "File loaded",
         "chunk_index": 0,
@@ -73,29 +136,220 @@ def upload():
     })
 
 
+@app.errorhandler(zipfile.BadZipFile)
+def bad_archive_member(e):
+    return jsonify({"error": f"Corrupt archive member: {e}"}), 400
+
+
+@app.errorhandler(TimeoutError)
+def extraction_timeout(e):
+    return jsonify({"error": str(e)}), 503
+
+
+# --- lazy chunk index
+# The first render only needs these message fields; embeds, reactions, mentions etc.
+# are read from the chunk by byte range when the client asks for /message/<idx>/<mi>.
+INDEX_DIR = ".chunk_index"
+DISPLAY_FIELDS = ("id", "type", "timestamp", "content", "attachments", "marked", "group")
+AUTHOR_FIELDS = ("id", "name", "nickname")
+_ws = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def scan_chunk(text):
+    # Walk the top-level object of a chunk and return its non-message fields and
+    # (start, end, message) character spans for every element of "messages"
+    def skip(pos):
+        return _ws.match(text, pos).end()
+
+    header, spans = {}, []
+    pos = skip(0)
+    if text[pos] != "{":
+        raise ValueError("chunk is not a JSON object")
+    pos = skip(pos + 1)
+    while text[pos] != "}":
+        key, pos = json.decoder.scanstring(text, pos + 1)
+        pos = skip(pos)
+        if text[pos] != ":":
+            raise ValueError(f"expected ':' at {pos}")
+        pos = skip(pos + 1)
+        if key == "messages" and text[pos] == "[":
+            pos = skip(pos + 1)
+            while text[pos] != "]":
+                msg, end = _decoder.raw_decode(text, pos)
+                spans.append((pos, end, msg))
+                pos = skip(end)
+                if text[pos] == ",":
+                    pos = skip(pos + 1)
+            pos += 1
+        else:
+            header[key], pos = _decoder.raw_decode(text, pos)
+        pos = skip(pos)
+        if text[pos] == ",":
+            pos = skip(pos + 1)
+    return header, spans
+
+
+def display_fields(msg):
+    view = {k: msg[k] for k in DISPLAY_FIELDS if k in msg}
+    author = msg.get("author")
+    if isinstance(author, dict):
+        view["author"] = {k: author[k] for k in AUTHOR_FIELDS if k in author}
+    return view
+
+
+def build_chunk_index(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    text = raw.decode("utf-8")
+    header, spans = scan_chunk(text)
+
+    # character spans -> byte spans; only non-ASCII text needs re-encoding
+    offsets = []
+    if len(raw) == len(text):
+        offsets = [[start, end] for start, end, _ in spans]
+    else:
+        cursor = byte_pos = 0
+        for start, end, _ in spans:
+            byte_pos += len(text[cursor:start].encode("utf-8"))
+            byte_start = byte_pos
+            byte_pos += len(text[start:end].encode("utf-8"))
+            cursor = end
+            offsets.append([byte_start, byte_pos])
+
+    header.pop("messageCount", None)
+    st = os.stat(path)
+    return {
+        "source_size": st.st_size,
+        "source_mtime": st.st_mtime_ns,
+        "header": header,
+        "messageCount": len(spans),
+        "offsets": offsets,
+        "messages": [display_fields(msg) if isinstance(msg, dict) else msg for _, _, msg in spans],
+    }
+
+
+def chunk_index(ws, fname):
+    # sidecar index per chunk, rebuilt whenever the chunk file changes;
+    # recently used ones stay parsed in the workspace
+    path = os.path.join(ws.extract_path, fname)
+    index_path = os.path.join(ws.extract_path, INDEX_DIR, fname + ".idx")
+    extraction.wait_for(ws.extract_path, fname)
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    index = ws.cached_index(fname, stamp)
+    if index is not None:
+        return index
+    index = read_chunk_index(path, index_path, st)
+    ws.cache_index(fname, stamp, index)
+    return index
+
+
+def read_chunk_index(path, index_path, st):
+    if os.path.exists(index_path):
+        with metrics.span("index_read"), open(index_path, "rb") as f:
+            raw = f.read()
+        metrics.add_read(len(raw))
+        try:
+            index = loads_json(raw)
+        except ValueError:
+            # unreadable (e.g. left half written by an older version): rebuild it
+            index = None
+        if (isinstance(index, dict) and index.get("source_size") == st.st_size
+                and index.get("source_mtime") == st.st_mtime_ns):
+            return index
+    app.logger.info("Indexing JSON file: %s", path)
+    with metrics.span("index_build"):
+        index = build_chunk_index(path)
+    metrics.add_read(st.st_size)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    raw = dumps_json(index, ensure_ascii=False, separators=(",", ":"))
+    # written aside and renamed, so readers in other threads or workers never see
+    # a partial file; the name is per writer since several may rebuild at once
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, index_path)
+    metrics.add_write(len(raw))
+    return index
+
+
 # --- update load_chunk to LOG the filename being loaded
-def load_chunk(idx):
-    json_files = session.get("json_files", [])
-    extract_path = session.get("extract_path")
-    if not json_files or not extract_path:
+def load_chunk(ws, idx):
+    if ws is None or not ws.json_files:
         return None
-    idx = max(0, min(idx, len(json_files) - 1))
-    path = os.path.join(extract_path, json_files[idx])
-    app.logger.info("Loading JSON file: %s", path)  # <<-- LOG the currently loaded filename
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    data["messageCount"] = len(data.get("messages", []))
+    idx = max(0, min(idx, ws.file_count - 1))
+    app.logger.info("Loading JSON file: %s", os.path.join(ws.extract_path, ws.json_files[idx]))  # <<-- LOG the currently loaded filename
+    index = chunk_index(ws, ws.json_files[idx])
+    data = dict(index["header"])
+    data["messages"] = index["messages"]
+    data["messageCount"] = index["messageCount"]
     return data
 
 
+@app.route("/message/<int:idx>/<int:mi>")
+def get_message(idx, mi):
+    # full message (embeds, reactions, mentions...) read by byte range from its chunk
+    ws = current_workspace()
+    if ws is None:
+        return jsonify({"error": "No file loaded"}), 400
+    if not 0 <= idx < ws.file_count:
+        return jsonify({"error": "Chunk not found"}), 404
+    index = chunk_index(ws, ws.json_files[idx])
+    if not 0 <= mi < len(index["offsets"]):
+        return jsonify({"error": "Message not found"}), 404
+    start, end = index["offsets"][mi]
+    with metrics.span("message_read"), open(os.path.join(ws.extract_path, ws.json_files[idx]), "rb") as f:
+        f.seek(start)
+        msg = loads_json(f.read(end - start))
+    metrics.add_read(end - start)
+    return jsonify(msg)
+
+
 @app.route("/get_chunk")
 def get_chunk():
-    idx = session.get("current_index", 0)
-    data = load_chunk(idx)
-    if not data:
+    ws = current_workspace()
+    if ws is None or not ws.json_files:
+        return jsonify({"error": "No file loaded"}), 400
+    idx = max(0, min(ws.current_index, ws.file_count - 1))
+    return jsonify(chunk_payload(ws, idx))
+
+
+@app.route("/query")
+def query_messages():
+    # filter the loaded archive via messages.db (built by chunkstore) instead of parsing chunks.
+    # chunkstore is only needed here, so the editor runs without it
+    try:
+        from chunkstore import COLUMNS, MessageStore
+    except ImportError:
+        return jsonify({"error": "chunkstore is not installed"}), 501
+    ws = current_workspace()
+    if ws is None:
         return jsonify({"error": "No file loaded"}), 400
-    return jsonify(
-        {"chunk_index": idx, "file_count": session.get("file_count", len(session.get("json_files", []))), "data": data})
+    db_path = os.path.join(ws.extract_path, "messages.db")
+    extraction.wait_for(ws.extract_path, "messages.db")
+    if not os.path.exists(db_path):
+        return jsonify({"error": "No messages.db in this archive"}), 404
+
+    columns = [c for c in request.args.get("columns", "chunk_index,position,author_name,content").split(",") if c]
+    # everything but the raw message; the editor has the chunks for that
+    if not columns or any(c not in COLUMNS or c == "raw" for c in columns):
+        return jsonify({"error": "Invalid columns"}), 400
+
+    with metrics.span("db_query"):
+        store = MessageStore(db_path)
+        try:
+            results = list(store.query(
+                columns=columns,
+                author=request.args.get("author") or None,
+                has_attachments=True if request.args.get("has_attachments") in ("1", "true") else None,
+                since=request.args.get("since") or None,
+                until=request.args.get("until") or None,
+                limit=request.args.get("limit", 1000, type=int),
+            ))
+        finally:
+            store.close()
+    return jsonify(results)
 
 
 # Recents
@@ -133,11 +387,13 @@ def export_marked():
     groups = request.json.get("groups", {})
     group_assignments = groups.get("assignments", {})
 
-    extract_path = session.get("extract_path")
-    if not extract_path:
+    ws = current_workspace()
+    if ws is None:
         return jsonify({"error": "No file loaded"}), 400
+    extract_path = ws.extract_path
+    extraction.wait_all(extract_path)
 
-    import tempfile, zipfile, shutil, sqlite3, os, json
+    import tempfile, zipfile, shutil, sqlite3, os
     from flask import send_file
 
     def attachment_id_from_ref(ref: str) -> str:
@@ -152,10 +408,12 @@ def export_marked():
         used_attachment_ids = set()
         chunk_files = []
 
-        for idx, fname in enumerate(session["json_files"]):
+        for idx, fname in enumerate(ws.json_files):
             src = os.path.join(extract_path, fname)
-            with open(src, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with metrics.span("json_parse"), open(src, "rb") as f:
+                raw = f.read()
+                data = loads_json(raw)
+            metrics.add_read(len(raw))
 
             new_messages = []
             for mi, msg in enumerate(data.get("messages", [])):
@@ -184,15 +442,20 @@ def export_marked():
                 data["messages"] = new_messages
                 new_fname = f"{len(chunk_files)}.json"
                 dst = os.path.join(tmpdir, new_fname)
-                with open(dst, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                with metrics.span("json_write"), open(dst, "wb") as f:
+                    raw = dumps_json(data, ensure_ascii=False, indent=2)
+                    f.write(raw)
+                metrics.add_write(len(raw))
                 chunk_files.append(new_fname)
 
         # Copy DB and remove unreferenced attachments
         db_src = os.path.join(extract_path, "packed_images.db")
         db_dst = os.path.join(tmpdir, "packed_images.db")
         if os.path.exists(db_src):
-            shutil.copy(db_src, db_dst)
+            with metrics.span("db_copy"):
+                shutil.copy(db_src, db_dst)
+            metrics.add_read(os.path.getsize(db_src))
+            metrics.add_write(os.path.getsize(db_dst))
 
             conn = sqlite3.connect(db_dst)
             c = conn.cursor()
@@ -205,7 +468,8 @@ def export_marked():
             else:
                 c.execute("DELETE FROM attachments")
             conn.commit()
-            c.execute("VACUUM")
+            with metrics.span("db_vacuum"):
+                c.execute("VACUUM")
             conn.commit()
             conn.close()
         else:
@@ -218,10 +482,11 @@ def export_marked():
 
         # create zip
         zip_path = os.path.join(tmpdir, "marked_export.zip")
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+        with metrics.span("zip"), zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
             for f in chunk_files:
                 zipf.write(os.path.join(tmpdir, f), arcname=f)
             zipf.write(db_dst, arcname="packed_images.db")
+        metrics.add_write(os.path.getsize(zip_path))
 
         return send_file(zip_path, as_attachment=True, download_name="marked_export.zip")
 
@@ -234,16 +499,14 @@ def load_recent():
     extract_path = os.path.join(base_folder, folder)
     if not os.path.exists(extract_path):
         return jsonify({"error": "Folder not found"}), 404
+    extraction.wait_all(extract_path)
     json_files = [f for f in os.listdir(extract_path) if f.endswith(".json")]
     json_files = sort_json_files(json_files)
     db_files = [f for f in os.listdir(extract_path) if f.endswith(".db")]
     if not json_files or "packed_images.db" not in db_files:
         return jsonify({"error": "Invalid folder"}), 400
-    session["json_files"] = json_files
-    session["extract_path"] = extract_path
-    session["current_index"] = 0
-    session["file_count"] = len(json_files)
-    data = load_chunk(0)
+    ws = open_workspace(extract_path, json_files)
+    data = load_chunk(ws, 0)
     return jsonify({
         "message": "Recent loaded",
         "chunk_index": 0,
@@ -253,25 +516,13 @@ def load_recent():
     })
 
 
-@app.route("/navigate", methods=["POST"])
-def navigate():
-    direction = request.json.get("direction")
-    json_files = session.get("json_files", [])
-
-    if not json_files:
-        return jsonify({"error": "No file loaded"}), 400
-
-    # Sort by the last number in the filename
-    def extract_index(filename):
-        match = re.findall(r"(\d+)", filename)
-        if not match:
-            return 0  # fallback if no number is found
-        return int(match[-1])  # take the last number
-
-    json_files = sorted(json_files, key=extract_index)
-    session["json_files"] = json_files
+def move_to(ws, direction, index=None):
+    # Sets and returns the workspace's chunk index for a /navigate direction.
+    # Shared with asgi.py. Raises ValueError for a goto without an integer index.
+    # the workspace's chunk list is already sorted by chunk number
+    json_files = ws.json_files
 
-    idx = session.get("current_index", 0)
+    idx = ws.current_index
     if idx is None or idx < 0 or idx >= len(json_files):
         idx = 0
 
@@ -285,38 +536,220 @@ def navigate():
         idx = max(idx - 1, 0)
     elif direction == "reload":
         pass
+    elif direction == "goto":
+        try:
+            idx = max(0, min(int(index), len(json_files) - 1))
+        except (TypeError, ValueError):
+            raise ValueError("goto needs an integer index")
 
-    session["current_index"] = idx
-    data = load_chunk(idx)
+    ws.current_index = idx
     logging.info(f"Navigating to index {idx}, file {json_files[idx]}")
+    return idx
 
-    return jsonify({
+
+def chunk_payload(ws, idx):
+    # the full file list is only sent when an archive is opened
+    return {
         "chunk_index": idx,
-        "file_count": len(json_files),
-        "data": data,
-        "json_files": json_files
+        "file_count": ws.file_count,
+        "data": load_chunk(ws, idx),
+        "file_name": ws.json_files[idx]
+    }
+
+
+@app.route("/navigate", methods=["POST"])
+def navigate():
+    ws = current_workspace()
+    if ws is None or not ws.json_files:
+        return jsonify({"error": "No file loaded"}), 400
+    try:
+        idx = move_to(ws, request.json.get("direction"), request.json.get("index"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(chunk_payload(ws, idx))
+
+
+# --- group index: group -> positions across the whole archive, see groups.py
+def normalize_group(group):
+    if not isinstance(group, dict):
+        return None
+    try:
+        out = {"id": int(group.get("id"))}
+    except (TypeError, ValueError):
+        return None
+    for field in ("name", "color"):
+        if isinstance(group.get(field), str):
+            out[field] = group[field]
+    return out
+
+
+def parse_position(key):
+    chunk, _, position = str(key).partition(":")
+    return int(chunk), int(position)
+
+
+def chunk_groups(messages):
+    out = []
+    for mi, msg in enumerate(messages):
+        group = normalize_group(msg.get("group")) if isinstance(msg, dict) else None
+        if group is not None:
+            out.append((mi, group))
+    return out
+
+
+def group_db_path(extract_path):
+    return os.path.join(extract_path, INDEX_DIR, "groups.db")
+
+
+def group_index(ws):
+    # Opened once per workspace. Chunks whose file changed since the index last saw
+    # them (or that it never saw) are re-read from their chunk index.
+    if ws.groups is not None:
+        return ws.groups
+    extraction.wait_all(ws.extract_path)
+    os.makedirs(os.path.join(ws.extract_path, INDEX_DIR), exist_ok=True)
+    index = GroupIndex(group_db_path(ws.extract_path), ws.id)
+    with metrics.span("group_sync"):
+        stamps = []
+        for fname in ws.json_files:
+            st = os.stat(os.path.join(ws.extract_path, fname))
+            stamps.append((fname, st.st_size, st.st_mtime_ns))
+        stale, removed = index.stale_chunks(stamps)
+        index.drop_chunks(removed)
+        for idx in stale:
+            index.replace_chunk(idx, chunk_groups(chunk_index(ws, ws.json_files[idx])["messages"]), stamps[idx])
+    with ws.lock:
+        if ws.groups is None:
+            ws.groups = index
+        else:
+            index.close()
+    return ws.groups
+
+
+def prune_workspaces():
+    # on startup: workspaces untouched for 30 days are forgotten, with their unsaved groups
+    for workspace_id, extract_path in workspaces.prune():
+        drop_pending(group_db_path(extract_path), [workspace_id])
+
+
+prune_workspaces()
+
+
+def last_position(ws, chunk):
+    return len(chunk_index(ws, ws.json_files[chunk])["offsets"]) - 1
+
+
+def positions_between(ws, start, end):
+    # every message from start to end inclusive, across chunk boundaries
+    (c1, p1), (c2, p2) = sorted((start, end))
+    for chunk in range(max(c1, 0), min(c2, ws.file_count - 1) + 1):
+        first = p1 if chunk == c1 else 0
+        last = p2 if chunk == c2 else last_position(ws, chunk)
+        for position in range(max(first, 0), last + 1):
+            yield chunk, position
+
+
+@app.route("/groups")
+def list_groups():
+    ws = current_workspace()
+    if ws is None:
+        return jsonify({"error": "No file loaded"}), 400
+    return jsonify({"groups": group_index(ws).groups()})
+
+
+@app.route("/groups/next")
+def next_group():
+    # ?from=<idx:mi>&direction=next|prev[&group=<id>] -> start of the next/previous group run
+    ws = current_workspace()
+    if ws is None:
+        return jsonify({"error": "No file loaded"}), 400
+    try:
+        start = parse_position(request.args.get("from", "0:-1"))
+    except ValueError:
+        return jsonify({"error": "from must look like <chunk>:<message>"}), 400
+    direction = -1 if request.args.get("direction") == "prev" else 1
+    index = group_index(ws)
+    found = index.next_run(start, lambda chunk: last_position(ws, chunk), direction,
+                           request.args.get("group", type=int))
+    if found is None:
+        return jsonify({"position": None})
+    chunk, position, gid = found
+    return jsonify({
+        "position": f"{chunk}:{position}",
+        "chunk_index": chunk,
+        "message_index": position,
+        "group": index.group(gid),
     })
 
 
+def valid_assign_body(body):
+    # the shapes assign_groups relies on; the positions themselves are checked as they're parsed
+    if not isinstance(body, dict):
+        return False
+    assign = body.get("assign") or {}
+    return (isinstance(assign, dict) and isinstance(assign.get("keys", []), list)
+            and isinstance(body.get("unassign") or [], list))
+
+
+@app.route("/groups/assign", methods=["POST"])
+def assign_groups():
+    # {"assign": {"group": {id, name, color}, "keys": [...] | "start": k, "end": k},
+    #  "unassign": [keys], "remove_group": id} - any combination
+    # Changes stay with the workspace until /save_marked writes them into the chunks.
+    ws = current_workspace()
+    if ws is None:
+        return jsonify({"error": "No file loaded"}), 400
+    body = request.get_json(silent=True) or {}
+    if not valid_assign_body(body):
+        return jsonify({"error": "Expected {\"assign\": {...}, \"unassign\": [...], \"remove_group\": id}"}), 400
+    index = group_index(ws)
+    try:
+        if body.get("assign"):
+            assign = body["assign"]
+            group = normalize_group(assign.get("group"))
+            if group is None:
+                return jsonify({"error": "assign needs a group with an integer id"}), 400
+            if "start" in assign:
+                positions = list(positions_between(ws, parse_position(assign["start"]),
+                                                   parse_position(assign.get("end", assign["start"]))))
+            else:
+                positions = [parse_position(k) for k in assign.get("keys", [])]
+            index.assign(positions, group)
+        if body.get("unassign"):
+            index.unassign([parse_position(k) for k in body["unassign"]])
+        if body.get("remove_group") is not None:
+            index.remove_group(int(body["remove_group"]))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Positions must look like <chunk>:<message>"}), 400
+    return jsonify({"message": "Groups updated"})
+
+
+def read_attachment(ws, attachment_id):
+    # uses the workspace's open DB handle instead of a new connection per image
+    with metrics.span("db_read"), ws.lock:
+        return ws.attachments_db().execute(
+            "SELECT file_name, mime_type, data FROM attachments WHERE id = ?", (attachment_id,)).fetchone()
+
+
 @app.route('/attachment/<path:attachment_id>')
 def get_attachment(attachment_id):
-    db_path = os.path.join(session["extract_path"], 'packed_images.db')
+    ws = current_workspace()
+    if ws is None:
+        return jsonify({"error": "No file loaded"}), 400
+    db_path = os.path.join(ws.extract_path, 'packed_images.db')
     if not os.path.exists(db_path):
         return jsonify({"error": "Database not found",
-                        "info": f"upload_folder: {db_path} , extract_folder: {session["extract_path"]}"}), 404
+                        "info": f"upload_folder: {db_path} , extract_folder: {ws.extract_path}"}), 404
 
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
     # ✅ only use the last segment if prefixed with "attachments/"
     if attachment_id.startswith("attachments/"):
         attachment_id = attachment_id.split("/", 1)[1]
 
-    c.execute("SELECT file_name, mime_type, data FROM attachments WHERE id = ?", (attachment_id,))
-    row = c.fetchone()
-    conn.close()
+    row = read_attachment(ws, attachment_id)
 
     if row:
         file_name, mime_type, blob = row
+        metrics.add_read(len(blob))
         return send_file(io.BytesIO(blob), mimetype=mime_type, download_name=file_name)
     else:
         return jsonify({"error": "Attachment not found"}), 404
@@ -325,35 +758,92 @@ def get_attachment(attachment_id):
 @app.route("/attachment/<file_id>")
 def attachment(file_id):
     print(file_id)
-    extract_path = session.get("extract_path")
-    logging.info(extract_path)
-    if not extract_path:
+    ws = current_workspace()
+    if ws is None:
         abort(404)
-    db_path = os.path.join(extract_path, "packed_images.db")
+    logging.info(ws.extract_path)
+    db_path = os.path.join(ws.extract_path, "packed_images.db")
     if not os.path.exists(db_path):
         abort(404)
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT file_name, mime_type, data FROM attachments WHERE id = ?", (file_id,))
+    row = read_attachment(ws, file_id)
     print(file_id)
-    row = cursor.fetchone()
-    conn.close()
     if not row:
         abort(404)
 
     file_name, mime_type, blob = row
+    metrics.add_read(len(blob))
     return send_file(io.BytesIO(blob), mimetype=mime_type, as_attachment=False, download_name=file_name)
 
 
+# ids per IN (...) query, below SQLite's default variable limit on older builds
+BATCH_QUERY_SIZE = 900
+BATCH_FETCH_ROWS = 32
+
+
+def attachment_records(ws, ids):
+    # One query per BATCH_QUERY_SIZE ids. Rows are fetched a few at a time under the
+    # workspace lock and written out with it released, so a large batch neither
+    # holds every blob in memory nor blocks other requests while it is being sent.
+    # This runs after the request has ended, so its metrics are recorded directly.
+    read_time = 0.0
+    read_bytes = 0
+    for start in range(0, len(ids), BATCH_QUERY_SIZE):
+        part = ids[start:start + BATCH_QUERY_SIZE]
+        with ws.lock:
+            cursor = ws.attachments_db().execute(
+                f"SELECT id, file_name, mime_type, data FROM attachments WHERE id IN ({','.join('?' * len(part))})",
+                part)
+        while True:
+            t0 = time.perf_counter()
+            with ws.lock:
+                rows = cursor.fetchmany(BATCH_FETCH_ROWS)
+            read_time += time.perf_counter() - t0
+            if not rows:
+                break
+            for attachment_id, file_name, mime_type, blob in rows:
+                header = dumps_json({"id": attachment_id, "mime_type": mime_type,
+                                     "file_name": file_name, "size": len(blob)},
+                                    ensure_ascii=False, separators=(",", ":"))
+                read_bytes += len(blob)
+                yield struct.pack(">I", len(header)) + header + blob
+    metrics.observe("attachments_batch", "db_read", read_time)
+    metrics.count("disk_read_bytes", read_bytes, "attachments_batch")
+
+
+def batch_ids(body):
+    # unique attachment ids from a /attachments body, or None if it isn't {"ids": [str, ...]}
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return None
+    return list(dict.fromkeys(i.split("/", 1)[1] if i.startswith("attachments/") else i for i in ids))
+
+
+@app.route("/attachments", methods=["POST"])
+def attachments_batch():
+    # Several attachments in one response: for each one found, a 4-byte big-endian
+    # header length, a JSON header {id, mime_type, file_name, size}, then size bytes
+    # of data. Ids that aren't in the DB are left out.
+    ws = current_workspace()
+    if ws is None:
+        return jsonify({"error": "No file loaded"}), 400
+    ids = batch_ids(request.get_json(silent=True, force=True))
+    if ids is None:
+        return jsonify({"error": "Expected {\"ids\": [...]}"}), 400
+    extraction.wait_for(ws.extract_path, "packed_images.db")
+    return Response(attachment_records(ws, ids), mimetype="application/octet-stream")
+
+
 @app.route("/save_marked", methods=["POST"])
 def save_marked():
     marks = request.json.get("marks", {}) or {}
     groups = request.json.get("groups", {}) or {}
     group_assignments = groups.get("assignments", {}) or {}
-    extract_path = session.get("extract_path")
-    if not extract_path:
+    ws = current_workspace()
+    if ws is None:
         return jsonify({"error": "No file loaded"}), 400
+    extract_path = ws.extract_path
+    extraction.wait_all(extract_path)
     save_path = os.path.join(SAVE_FOLDER, os.path.basename(extract_path))
     os.makedirs(save_path, exist_ok=True)
 
@@ -367,6 +857,12 @@ def save_marked():
         if ":" in k:
             idx = int(k.split(":", 1)[0])
             affected_indices.add(idx)
+    # chunks with unsaved /groups/assign changes, e.g. every group removed from one.
+    # Those may have been made on another worker, so the index is opened whenever
+    # the folder has one.
+    index = group_index(ws) if os.path.exists(group_db_path(extract_path)) else None
+    if index is not None:
+        affected_indices |= index.pending_chunks()
 
     # if none affected then nothing to write, but still ensure DB copied
     if not affected_indices:
@@ -374,27 +870,35 @@ def save_marked():
         if os.path.exists(db_src):
             db_dst = os.path.join(save_path, "packed_images.db")
             if os.path.abspath(db_src) != os.path.abspath(db_dst):
-                shutil.copyfile(db_src, db_dst)
+                with metrics.span("db_copy"):
+                    shutil.copyfile(db_src, db_dst)
+                metrics.add_read(os.path.getsize(db_src))
+                metrics.add_write(os.path.getsize(db_dst))
         return jsonify({"message": "Marked data saved (no JSON changes)"}), 200
 
     # only rewrite the affected JSON files
-    for idx, fname in enumerate(session["json_files"]):
+    for idx, fname in enumerate(ws.json_files):
         if idx not in affected_indices:
             # copy untouched file to save folder to keep archive coherent
             src = os.path.join(extract_path, fname)
             dst = os.path.join(save_path, fname)
             # only copy if destination missing or source newer
-            try:
-                if not os.path.exists(dst) or os.path.getmtime(src) > os.path.getmtime(dst):
+            with metrics.span("json_copy"):
+                try:
+                    if not os.path.exists(dst) or os.path.getmtime(src) > os.path.getmtime(dst):
+                        shutil.copyfile(src, dst)
+                        metrics.add_write(os.path.getsize(dst))
+                except Exception:
                     shutil.copyfile(src, dst)
-            except Exception:
-                shutil.copyfile(src, dst)
+                    metrics.add_write(os.path.getsize(dst))
             continue
 
         src = os.path.join(extract_path, fname)
         dst = os.path.join(save_path, fname)
-        with open(src, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with metrics.span("json_parse"), open(src, "rb") as f:
+            raw = f.read()
+            data = loads_json(raw)
+        metrics.add_read(len(raw))
         for mi, msg in enumerate(data.get("messages", [])):
             key = f"{idx}:{mi}"
             # marks
@@ -416,15 +920,29 @@ def save_marked():
             else:
                 msg.pop("group", None)
         # write modified JSON
-        with open(dst, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with metrics.span("json_write"), open(dst, "wb") as f:
+            raw = dumps_json(data, ensure_ascii=False, indent=2)
+            f.write(raw)
+        metrics.add_write(len(raw))
+        # keep the open group index in step: saved in place, the new file is its source;
+        # saved elsewhere, the extracted chunk is unchanged and only this workspace
+        # sees the saved groups
+        if index is not None:
+            if os.path.abspath(src) == os.path.abspath(dst):
+                st = os.stat(dst)
+                index.replace_chunk(idx, chunk_groups(data.get("messages", [])), (fname, st.st_size, st.st_mtime_ns))
+            else:
+                index.stage_chunk(idx, chunk_groups(data.get("messages", [])))
 
     # copy DB once
     db_src = os.path.join(extract_path, "packed_images.db")
     if os.path.exists(db_src):
         db_dst = os.path.join(save_path, "packed_images.db")
         if os.path.abspath(db_src) != os.path.abspath(db_dst):
-            shutil.copyfile(db_src, db_dst)
+            with metrics.span("db_copy"):
+                shutil.copyfile(db_src, db_dst)
+            metrics.add_read(os.path.getsize(db_src))
+            metrics.add_write(os.path.getsize(db_dst))
 
     return jsonify({"message": "Marked data saved"}), 200
 
@@ -432,9 +950,11 @@ def save_marked():
 @app.route("/export_save", methods=["POST"])
 def export_save():
     marks = request.json.get("marks", {})
-    extract_path = session.get("extract_path")
-    if not extract_path:
+    ws = current_workspace()
+    if ws is None:
         return jsonify({"error": "No file loaded"}), 400
+    extract_path = ws.extract_path
+    extraction.wait_all(extract_path)
 
     # temp folder
     import tempfile, shutil
@@ -442,11 +962,13 @@ def export_save():
 
     # process jsons
     kept_attachments = set()
-    for idx, fname in enumerate(session["json_files"]):
+    for idx, fname in enumerate(ws.json_files):
         src = os.path.join(extract_path, fname)
         dst = os.path.join(temp_dir, fname)
-        with open(src, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with metrics.span("json_parse"), open(src, "rb") as f:
+            raw = f.read()
+            data = loads_json(raw)
+        metrics.add_read(len(raw))
         new_msgs = []
         for mi, msg in enumerate(data.get("messages", [])):
             key = f"{idx}:{mi}"
@@ -458,8 +980,10 @@ def export_save():
                     attid = att.replace("db://attachments/", "")
                     kept_attachments.add(attid)
         data["messages"] = new_msgs
-        with open(dst, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with metrics.span("json_write"), open(dst, "wb") as f:
+            raw = dumps_json(data, ensure_ascii=False, indent=2)
+            f.write(raw)
+        metrics.add_write(len(raw))
 
     # copy db but only keep kept_attachments
     db_src = os.path.join(extract_path, "packed_images.db")
@@ -471,17 +995,22 @@ def export_save():
         cdst = conn_dst.cursor()
         # recreate schema
         cdst.execute("CREATE TABLE attachments (id TEXT PRIMARY KEY, file_name TEXT, mime_type TEXT, data BLOB)")
-        for attid in kept_attachments:
-            row = csrc.execute("SELECT id,file_name,mime_type,data FROM attachments WHERE id=?", (attid,)).fetchone()
-            if row:
-                cdst.execute("INSERT INTO attachments VALUES (?,?,?,?)", row)
-        conn_dst.commit()
+        with metrics.span("db_copy"):
+            for attid in kept_attachments:
+                row = csrc.execute("SELECT id,file_name,mime_type,data FROM attachments WHERE id=?", (attid,)).fetchone()
+                if row:
+                    cdst.execute("INSERT INTO attachments VALUES (?,?,?,?)", row)
+                    metrics.add_read(len(row[3] or b""))
+            conn_dst.commit()
+        metrics.add_write(os.path.getsize(db_dst))
         conn_src.close()
         conn_dst.close()
 
     # zip it
     zip_path = os.path.join(SAVE_FOLDER, "exported.zip")
-    shutil.make_archive(zip_path.replace(".zip", ""), 'zip', temp_dir)
+    with metrics.span("zip"):
+        shutil.make_archive(zip_path.replace(".zip", ""), 'zip', temp_dir)
+    metrics.add_write(os.path.getsize(zip_path))
     shutil.rmtree(temp_dir)
 
     return send_file(zip_path, as_attachment=True)
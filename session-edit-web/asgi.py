@@ -0,0 +1,410 @@
+# Optional async serving mode: uvicorn asgi:app (needs the "asgi" extra).
+#
+# The routes hit most while browsing - images, the attachment batch, /navigate and
+# /get_chunk - are served natively here. Their blocking SQLite and JSON work runs on
+# bounded thread pools, and attachments are streamed in pieces that are only read
+# once the previous one has been sent. Everything else (uploads, saves, exports...)
+# is the Flask app on a pool of its own, so a few large uploads can't hold up image
+# serving. Flask reads the request body straight from receive(), so an upload is
+# written to disk once, by extraction.save_stream.
+import asyncio
+import io
+import logging
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from itsdangerous import BadSignature
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import parse_cookie
+
+import app as editor
+import metrics
+
+# attachment reads; SQLite calls on one workspace are serialised by its lock anyway
+DB_THREADS = int(os.environ.get("ASGI_DB_THREADS", "8"))
+# chunk index loading and JSON encoding
+CHUNK_THREADS = int(os.environ.get("ASGI_CHUNK_THREADS", "4"))
+# Flask requests running at once; the rest wait without taking a thread
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "8"))
+STREAM_BLOCK = 64 * 1024
+
+db_pool = ThreadPoolExecutor(DB_THREADS, thread_name_prefix="asgi-db")
+chunk_pool = ThreadPoolExecutor(CHUNK_THREADS, thread_name_prefix="asgi-chunk")
+wsgi_pool = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="asgi-wsgi")
+serializer = editor.app.session_interface.get_signing_serializer(editor.app)
+log = logging.getLogger("asgi")
+
+
+class RequestBody(io.RawIOBase):
+    # wsgi.input for the Flask app: pulls the body from receive() as Flask reads it,
+    # instead of spooling all of it to a temporary file first
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.piece = memoryview(b"")
+        self.more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.piece and self.more:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            self.piece = memoryview(message.get("body", b""))
+            self.more = message.get("more_body", False)
+        n = min(len(buffer), len(self.piece))
+        buffer[:n] = self.piece[:n]
+        self.piece = self.piece[n:]
+        return n
+
+
+def wsgi_environ(scope, body):
+    # PEP 3333 environ for an ASGI http scope
+    script_name = scope.get("root_path", "").encode("utf-8").decode("latin-1")
+    path_info = scope["path"].encode("utf-8").decode("latin-1")
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # read to the end of the body, with or without a Content-Length
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            name = "HTTP_" + name
+        value = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def wsgi_app(scope, receive, send):
+    # Runs the Flask app on wsgi_pool. Each piece of the response is handed to send()
+    # and the next one only produced once it has gone out.
+    loop = asyncio.get_running_loop()
+
+    def send_now(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def call():
+        response = {"start": None, "sent": False}
+
+        def write(data):
+            if not response["sent"]:
+                send_now(response["start"])
+                response["sent"] = True
+            if data:
+                send_now({"type": "http.response.body", "body": data, "more_body": True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response["sent"]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["start"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            }
+            return write
+
+        result = editor.app(wsgi_environ(scope, RequestBody(receive, loop)), start_response)
+        try:
+            for data in result:
+                write(data)
+            write(b"")
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        send_now({"type": "http.response.body", "body": b""})
+
+    await loop.run_in_executor(wsgi_pool, call)
+
+
+class NativeRequest:
+    # timing and status of one natively served request, recorded like Flask's (metrics.record)
+
+    def __init__(self, route):
+        self.route = route
+        self.spans = {}
+        self.start = time.perf_counter()
+        self.status = None
+        self.length = None
+
+    async def run(self, pool, fn, *args):
+        def call():
+            with metrics.collect(self.route, self.spans):
+                return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(pool, call)
+
+    async def start_response(self, send, status, content_type, headers=(), length=None):
+        self.status = status
+        self.length = length
+        headers = [(b"content-type", content_type.encode("latin-1")), *headers]
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        if editor.app.config["SERVER_TIMING"]:
+            total = time.perf_counter() - self.start
+            headers.append((b"server-timing", metrics.timing_header(self.spans, total).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+    async def send_json(self, send, status, body):
+        if not isinstance(body, bytes):
+            body = json_bytes(body)
+        await self.start_response(send, status, "application/json", length=len(body))
+        await send({"type": "http.response.body", "body": body})
+
+
+def json_bytes(obj):
+    # same body as jsonify
+    return (editor.app.json.dumps(obj) + "\n").encode("utf-8")
+
+
+def session_workspace(scope):
+    # the workspace id from Flask's signed session cookie, checked the way
+    # SecureCookieSessionInterface.open_session does it
+    header = "; ".join(value.decode("latin-1") for name, value in scope["headers"] if name == b"cookie")
+    value = parse_cookie(header).get(editor.app.config["SESSION_COOKIE_NAME"])
+    if not value:
+        return None
+    try:
+        data = serializer.loads(value, max_age=int(editor.app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return editor.workspaces.get(data.get("workspace"))
+
+
+async def read_body(receive):
+    parts = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionError("client went away")
+        parts.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(parts)
+
+
+def watch_disconnect(receive):
+    # call once the body has been read: the only message left is http.disconnect
+    gone = asyncio.Event()
+
+    async def watch():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        gone.set()
+
+    return gone, asyncio.ensure_future(watch())
+
+
+def chunk_errors(fn):
+    # the errors Flask's errorhandlers turn into JSON (see app.py)
+    def call(*args):
+        try:
+            return fn(*args)
+        except zipfile.BadZipFile as e:
+            return 400, json_bytes({"error": f"Corrupt archive member: {e}"})
+        except TimeoutError as e:
+            return 503, json_bytes({"error": str(e)})
+    return call
+
+
+@chunk_errors
+def navigate_work(scope, payload):
+    ws = session_workspace(scope)
+    if ws is None or not ws.json_files:
+        return 400, json_bytes({"error": "No file loaded"})
+    try:
+        idx = editor.move_to(ws, payload.get("direction"), payload.get("index"))
+    except ValueError as e:
+        return 400, json_bytes({"error": str(e)})
+    return 200, json_bytes(editor.chunk_payload(ws, idx))
+
+
+@chunk_errors
+def get_chunk_work(scope):
+    ws = session_workspace(scope)
+    if ws is None or not ws.json_files:
+        return 400, json_bytes({"error": "No file loaded"})
+    idx = max(0, min(ws.current_index, ws.file_count - 1))
+    return 200, json_bytes(editor.chunk_payload(ws, idx))
+
+
+async def navigate(req, scope, receive, send):
+    try:
+        payload = editor.loads_json(await read_body(receive) or b"{}")
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return await req.send_json(send, 400, {"error": "Expected a JSON object"})
+    status, body = await req.run(chunk_pool, navigate_work, scope, payload)
+    await req.send_json(send, status, body)
+
+
+async def get_chunk(req, scope, receive, send):
+    status, body = await req.run(chunk_pool, get_chunk_work, scope)
+    await req.send_json(send, status, body)
+
+
+def open_attachment(scope, attachment_id):
+    ws = session_workspace(scope)
+    if ws is None:
+        return None, None, None
+    editor.extraction.wait_for(ws.extract_path, "packed_images.db")
+    with metrics.span("db_read"), ws.lock:
+        db = ws.attachments_db()
+        row = db.execute("SELECT rowid, file_name, mime_type, length(data) FROM attachments WHERE id = ?",
+                         (attachment_id,)).fetchone()
+        blob = db.blobopen("attachments", "data", row[0], readonly=True) if row else None
+    return ws, row, blob
+
+
+def read_piece(ws, blob):
+    with metrics.span("db_read"), ws.lock:
+        return blob.read(STREAM_BLOCK)
+
+
+def close_blob(ws, blob):
+    with ws.lock:
+        blob.close()
+
+
+def content_disposition(file_name):
+    try:
+        file_name.encode("ascii")
+        return f'inline; filename="{file_name}"'
+    except UnicodeEncodeError:
+        return f"inline; filename*=UTF-8''{quote(file_name)}"
+
+
+async def attachment(req, scope, receive, send):
+    attachment_id = scope["path"][len("/attachment/"):]
+    # same as the <path:...> route: only the last segment of attachments/<id>
+    if attachment_id.startswith("attachments/"):
+        attachment_id = attachment_id.split("/", 1)[1]
+    await read_body(receive)
+    ws, row, blob = await req.run(db_pool, open_attachment, scope, attachment_id)
+    if ws is None:
+        return await req.send_json(send, 400, {"error": "No file loaded"})
+    if row is None:
+        return await req.send_json(send, 404, {"error": "Attachment not found"})
+
+    _, file_name, mime_type, size = row
+    gone, watcher = watch_disconnect(receive)
+    try:
+        await req.start_response(send, 200, mime_type or "application/octet-stream", length=size,
+                                 headers=[(b"content-disposition", content_disposition(file_name or attachment_id).encode("latin-1"))])
+        sent = 0
+        # the next piece is read only after send() returns, and uvicorn's send waits
+        # while the socket is backed up, so a slow client holds one piece at a time
+        while sent < size and not gone.is_set():
+            piece = await req.run(db_pool, read_piece, ws, blob)
+            if not piece:
+                break
+            sent += len(piece)
+            await send({"type": "http.response.body", "body": piece, "more_body": sent < size})
+        if size == 0:
+            await send({"type": "http.response.body", "body": b""})
+        metrics.count("disk_read_bytes", sent, req.route)
+    finally:
+        watcher.cancel()
+        await req.run(db_pool, close_blob, ws, blob)
+
+
+async def attachments_batch(req, scope, receive, send):
+    try:
+        ids = editor.batch_ids(editor.loads_json(await read_body(receive) or b"{}"))
+    except ValueError:
+        ids = None
+    ws = await req.run(db_pool, session_workspace, scope)
+    if ws is None:
+        return await req.send_json(send, 400, {"error": "No file loaded"})
+    if ids is None:
+        return await req.send_json(send, 400, {"error": "Expected {\"ids\": [...]}"})
+    await req.run(db_pool, editor.extraction.wait_for, ws.extract_path, "packed_images.db")
+
+    records = editor.attachment_records(ws, ids)
+    gone, watcher = watch_disconnect(receive)
+    try:
+        await req.start_response(send, 200, "application/octet-stream")
+        while not gone.is_set():
+            record = await req.run(db_pool, next, records, None)
+            if record is None:
+                break
+            await send({"type": "http.response.body", "body": record, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        watcher.cancel()
+        await req.run(db_pool, records.close)
+
+
+# (method, path) -> (metrics route name, handler); /attachment/<id> is matched by prefix
+ROUTES = {
+    ("POST", "/navigate"): ("navigate", navigate),
+    ("GET", "/get_chunk"): ("get_chunk", get_chunk),
+    ("POST", "/attachments"): ("attachments_batch", attachments_batch),
+}
+
+
+def native_route(scope):
+    path, method = scope["path"], scope["method"]
+    if (method, path) in ROUTES:
+        return ROUTES[(method, path)]
+    if method == "GET" and path.startswith("/attachment/") and len(path) > len("/attachment/"):
+        return ("attachment" if "/" not in path[len("/attachment/"):] else "get_attachment"), attachment
+    return None
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            db_pool.shutdown(wait=False, cancel_futures=True)
+            chunk_pool.shutdown(wait=False, cancel_futures=True)
+            wsgi_pool.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    route = native_route(scope) if scope["type"] == "http" else None
+    if route is None:
+        return await wsgi_app(scope, receive, send)
+
+    name, handler = route
+    req = NativeRequest(name)
+    try:
+        await handler(req, scope, receive, send)
+    except ConnectionError:
+        req.status = req.status or 499
+    except Exception:
+        log.exception("Exception on %s %s", scope["method"], scope["path"])
+        if req.status is None:
+            await req.send_json(send, 500, {"error": "Internal Server Error"})
+    finally:
+        metrics.record(name, req.spans, time.perf_counter() - req.start, req.status or 500, req.length)
@@ -0,0 +1,221 @@
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# Shared by all uploads so several large archives can't start unbounded threads
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+_pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+
+# Present in an extract folder while members are still being written
+MARKER = ".extracting"
+COPY_BLOCK = 1024 * 1024
+
+_active_lock = threading.Lock()
+_active = {}  # extract_path -> latest Extraction of that folder
+
+
+def save_stream(stream, filepath):
+    # Copy a request body to disk in blocks instead of buffering it whole
+    written = 0
+    tmp_path = filepath + ".part"
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                block = stream.read(COPY_BLOCK)
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+    except BaseException:
+        # e.g. the client went away mid-upload
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, filepath)
+    return written
+
+
+def member_path(extract_path, name):
+    # Same sanitising as ZipFile.extract: no absolute paths, no "..", no empty parts
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    if not parts:
+        return None
+    return os.path.join(extract_path, *parts)
+
+
+class Extraction:
+    # Extracts a ZIP with several threads. The given priority members are written
+    # first on the calling thread; everything else runs on the shared pool and
+    # becomes readable as soon as its own member is done. Each member is written
+    # to a .part file and renamed only after zipfile has checked its CRC, so
+    # readers never see a partial or corrupt file.
+    #
+    # zip_path must not change until the extraction has finished, as worker threads
+    # open their own handles on it; with keep_as, it is moved there at the end, or
+    # deleted if the extraction failed before the priority members were out.
+
+    def __init__(self, zip_path, extract_path, keep_as=None):
+        self.zip_path = zip_path
+        self.extract_path = extract_path
+        self.keep_as = keep_as
+        self.local = threading.local()
+        self.handles = []
+        self.events = {}
+        self.errors = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        with zipfile.ZipFile(zip_path) as z:
+            self.members = [info for info in z.infolist() if member_path(extract_path, info.filename)]
+        for info in self.members:
+            self.events[self.relname(info)] = threading.Event()
+
+    def relname(self, info):
+        return os.path.relpath(member_path(self.extract_path, info.filename), self.extract_path)
+
+    def top_level_files(self):
+        return [self.relname(info) for info in self.members
+                if not info.is_dir() and os.sep not in self.relname(info)]
+
+    def start(self, priority=()):
+        # registered before waiting, so extractions of the same folder run one after
+        # another and readers wait for this one's members rather than the old files
+        with _active_lock:
+            previous = _active.get(self.extract_path)
+            _active[self.extract_path] = self
+        if previous is not None:
+            previous.finished.wait()
+        try:
+            if os.path.exists(self.extract_path):
+                # moved aside first: a reader still writing into the old folder can't
+                # make the delete fail or leave files in the new one
+                old_path = f"{self.extract_path}.old-{os.getpid()}-{threading.get_ident()}"
+                os.rename(self.extract_path, old_path)
+                shutil.rmtree(old_path, ignore_errors=True)
+            os.makedirs(self.extract_path)
+            open(os.path.join(self.extract_path, MARKER), "w").close()
+        except OSError as e:
+            for name, event in self.events.items():
+                self.errors[name] = e
+                event.set()
+            self.finish(keep=False)
+            raise
+
+        first = [info for info in self.members if self.relname(info) in priority]
+        rest = [info for info in self.members if self.relname(info) not in priority]
+        for info in first:
+            self.extract(info)
+        failed = [name for name in priority if name in self.errors]
+        if failed or not rest:
+            self.finish(keep=not failed)
+        if failed:
+            self.wait(failed[0])
+        if not rest:
+            return
+        self.pending = len(rest)
+        self.started = time.perf_counter()
+        # biggest members first so the pool isn't left waiting on one large file at the end
+        for info in sorted(rest, key=lambda i: i.file_size, reverse=True):
+            _pool.submit(self.extract_background, info)
+
+    def zipfile(self):
+        z = getattr(self.local, "zipfile", None)
+        if z is None:
+            # one handle per thread: seeks on a shared ZipFile would serialise the workers
+            z = self.local.zipfile = zipfile.ZipFile(self.zip_path)
+            with self.lock:
+                self.handles.append(z)
+        return z
+
+    def extract(self, info):
+        name = self.relname(info)
+        target = os.path.join(self.extract_path, name)
+        try:
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with self.zipfile().open(info) as src, open(target + ".part", "wb") as dst:
+                    shutil.copyfileobj(src, dst, COPY_BLOCK)
+                os.replace(target + ".part", target)
+                metrics.add_write(info.file_size)
+        except Exception as e:
+            # BadZipFile here means the CRC didn't match
+            self.errors[name] = e
+            if os.path.exists(target + ".part"):
+                os.remove(target + ".part")
+        finally:
+            self.events[name].set()
+
+    def extract_background(self, info):
+        self.extract(info)
+        with self.lock:
+            self.pending -= 1
+            done = self.pending == 0
+        if done:
+            metrics.observe("upload", "extract_background", time.perf_counter() - self.started)
+            self.finish()
+
+    def finish(self, keep=True):
+        for z in self.handles:
+            z.close()
+        if self.keep_as is not None:
+            if keep:
+                os.replace(self.zip_path, self.keep_as)
+            else:
+                os.remove(self.zip_path)
+        marker = os.path.join(self.extract_path, MARKER)
+        if os.path.exists(marker):
+            os.remove(marker)
+        # stays in _active until the folder is extracted again, so members that
+        # failed their CRC keep reporting that instead of a missing file
+        self.finished.set()
+
+    def wait(self, name, timeout=None):
+        event = self.events.get(name)
+        if event is None:
+            return
+        if not event.wait(timeout):
+            raise TimeoutError(f"{name} is still being extracted")
+        if name in self.errors:
+            raise zipfile.BadZipFile(f"{name}: {self.errors[name]}")
+
+
+def wait_for(extract_path, name, timeout=60):
+    # Block until a member of an archive that may still be extracting is on disk
+    with _active_lock:
+        extraction = _active.get(extract_path)
+    if extraction is not None:
+        extraction.wait(name, timeout)
+        return
+    # extracted by another worker process: poll until the file appears or extraction ends
+    path = os.path.join(extract_path, name)
+    marker = os.path.join(extract_path, MARKER)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path) and os.path.exists(marker):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{name} is still being extracted")
+        time.sleep(0.05)
+
+
+def wait_all(extract_path, timeout=600):
+    # For routes that read every chunk of a folder (save, export, load_recent)
+    with _active_lock:
+        extraction = _active.get(extract_path)
+    if extraction is not None:
+        if not extraction.finished.wait(timeout):
+            raise TimeoutError(f"{extract_path} is still being extracted")
+        if extraction.errors:
+            name, error = next(iter(extraction.errors.items()))
+            raise zipfile.BadZipFile(f"{name}: {error}")
+        return
+    marker = os.path.join(extract_path, MARKER)
+    deadline = time.monotonic() + timeout
+    while os.path.exists(marker):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{extract_path} is still being extracted")
+        time.sleep(0.05)
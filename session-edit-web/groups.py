@@ -0,0 +1,244 @@
+import os
+import sqlite3
+import threading
+
+
+def adjacent(a, b, last_position):
+    # b directly follows a: next message in the chunk, or the first message of the next
+    # chunk when a is the last one of its chunk. last_position(chunk) -> index of its last message
+    if b == (a[0], a[1] + 1):
+        return True
+    return b[0] == a[0] + 1 and b[1] == 0 and a[1] == last_position(a[0])
+
+
+class GroupIndex:
+    # group -> (chunk, position) index for one extract folder, so group navigation
+    # doesn't have to load the chunks in between. The main tables hold what the
+    # chunk files on disk say: built from their "group" objects and rebuilt per chunk
+    # when a chunk file changes. Each workspace opens its own GroupIndex, and the
+    # assignments it hasn't saved yet go to the pending tables under its workspace
+    # id, so every worker process sees them and other workspaces don't. Queries go
+    # through the current_* views, which lay this workspace's pending changes over
+    # the main tables.
+
+    def __init__(self, db_path, workspace_id):
+        self.workspace = workspace_id
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk INTEGER PRIMARY KEY,
+                file_name TEXT,
+                size INTEGER,
+                mtime INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS groups (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                color TEXT
+            );
+            CREATE TABLE IF NOT EXISTS positions (
+                chunk INTEGER,
+                position INTEGER,
+                group_id INTEGER,
+                PRIMARY KEY (chunk, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS positions_group ON positions (group_id, chunk, position);
+
+            -- unsaved changes per workspace; group_id NULL means unassigned
+            CREATE TABLE IF NOT EXISTS pending (
+                workspace TEXT,
+                chunk INTEGER,
+                position INTEGER,
+                group_id INTEGER,
+                PRIMARY KEY (workspace, chunk, position)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS pending_groups (
+                workspace TEXT,
+                id INTEGER,
+                name TEXT,
+                color TEXT,
+                PRIMARY KEY (workspace, id)
+            ) WITHOUT ROWID;
+
+            -- the workspace the views below are for
+            CREATE TEMP TABLE this_workspace (id TEXT);
+            CREATE TEMP VIEW my_pending AS
+                SELECT chunk, position, group_id FROM main.pending
+                WHERE workspace = (SELECT id FROM this_workspace);
+            CREATE TEMP VIEW my_pending_groups AS
+                SELECT id, name, color FROM main.pending_groups
+                WHERE workspace = (SELECT id FROM this_workspace);
+            CREATE TEMP VIEW current_positions AS
+                SELECT chunk, position, group_id FROM my_pending WHERE group_id IS NOT NULL
+                UNION ALL
+                SELECT chunk, position, group_id FROM main.positions p
+                WHERE NOT EXISTS (SELECT 1 FROM my_pending q WHERE q.chunk = p.chunk AND q.position = p.position);
+            CREATE TEMP VIEW current_groups AS
+                SELECT id, name, color FROM my_pending_groups
+                UNION ALL
+                SELECT id, name, color FROM main.groups WHERE id NOT IN (SELECT id FROM my_pending_groups);
+        ''')
+        self.conn.execute("INSERT INTO this_workspace VALUES (?)", (workspace_id,))
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def stale_chunks(self, stamps):
+        # stamps: [(file_name, size, mtime_ns)] in chunk order
+        with self.lock:
+            stored = {row[0]: tuple(row[1:]) for row in self.conn.execute("SELECT * FROM main.chunks")}
+        stale = [idx for idx, stamp in enumerate(stamps) if stored.get(idx) != tuple(stamp)]
+        return stale, [idx for idx in stored if idx >= len(stamps)]
+
+    def drop_chunks(self, chunks):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM main.positions WHERE chunk = ?", [(c,) for c in chunks])
+            self.conn.executemany("DELETE FROM main.chunks WHERE chunk = ?", [(c,) for c in chunks])
+
+    def replace_chunk(self, chunk, assignments, stamp=None):
+        # The chunk file now holds these assignments: [(position, {"id", "name"?, "color"?})]
+        # for every grouped message. This workspace's pending changes to it go with it.
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM main.positions WHERE chunk = ?", (chunk,))
+            self.conn.execute("DELETE FROM pending WHERE workspace = ? AND chunk = ?", (self.workspace, chunk))
+            for _, group in assignments:
+                self._upsert_group(group)
+            self.conn.executemany("INSERT OR REPLACE INTO main.positions VALUES (?, ?, ?)",
+                                  [(chunk, position, group["id"]) for position, group in assignments])
+            if stamp is not None:
+                self.conn.execute("INSERT OR REPLACE INTO main.chunks VALUES (?, ?, ?, ?)", (chunk, *stamp))
+
+    def stage_chunk(self, chunk, assignments):
+        # Like replace_chunk, but for this workspace only: the chunk was saved somewhere
+        # else, so the file the main tables describe hasn't changed.
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM pending WHERE workspace = ? AND chunk = ?", (self.workspace, chunk))
+            self.conn.execute("INSERT INTO pending SELECT ?, chunk, position, NULL FROM main.positions WHERE chunk = ?",
+                              (self.workspace, chunk))
+            for _, group in assignments:
+                self._stage_group(group)
+            self.conn.executemany("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?)",
+                                  [(self.workspace, chunk, position, group["id"]) for position, group in assignments])
+
+    def assign(self, positions, group):
+        with self.lock, self.conn:
+            self._stage_group(group)
+            self.conn.executemany("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?)",
+                                  [(self.workspace, chunk, position, group["id"]) for chunk, position in positions])
+
+    def unassign(self, positions):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, NULL)",
+                                  [(self.workspace, chunk, position) for chunk, position in positions])
+
+    def remove_group(self, group_id):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO pending "
+                              "SELECT ?, chunk, position, NULL FROM current_positions WHERE group_id = ?",
+                              (self.workspace, group_id))
+
+    def pending_chunks(self):
+        # chunks with changes only this workspace has seen
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT DISTINCT chunk FROM my_pending")}
+
+    def _stage_group(self, group):
+        # starts from the saved name/color, so a group seen without them keeps them
+        self.conn.execute("INSERT OR IGNORE INTO pending_groups SELECT ?, id, name, color FROM main.groups WHERE id = ?",
+                          (self.workspace, group["id"]))
+        self.conn.execute('''
+            INSERT INTO pending_groups VALUES (?, ?, ?, ?)
+            ON CONFLICT (workspace, id) DO UPDATE SET name = COALESCE(excluded.name, name),
+                                                      color = COALESCE(excluded.color, color)
+        ''', (self.workspace, group["id"], group.get("name"), group.get("color")))
+
+    def _upsert_group(self, group):
+        # a group seen without name/color keeps the ones it already has
+        self.conn.execute('''
+            INSERT INTO main.groups VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET name = COALESCE(excluded.name, name),
+                                           color = COALESCE(excluded.color, color)
+        ''', (group["id"], group.get("name"), group.get("color")))
+
+    def groups(self):
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT g.id, g.name, g.color,
+                       (SELECT COUNT(*) FROM current_positions WHERE group_id = g.id),
+                       (SELECT chunk || ':' || position FROM current_positions WHERE group_id = g.id
+                        ORDER BY chunk, position LIMIT 1)
+                FROM current_groups g ORDER BY g.id
+            ''').fetchall()
+        return [{"id": gid, "name": name, "color": color, "count": n, "first": first}
+                for gid, name, color, n, first in rows if n]
+
+    def group_at(self, chunk, position):
+        with self.lock:
+            row = self.conn.execute("SELECT group_id FROM current_positions WHERE chunk = ? AND position = ?",
+                                    (chunk, position)).fetchone()
+        return row[0] if row else None
+
+    def group(self, group_id):
+        with self.lock:
+            row = self.conn.execute("SELECT id, name, color FROM current_groups WHERE id = ?", (group_id,)).fetchone()
+        return {"id": row[0], "name": row[1], "color": row[2]} if row else None
+
+    def next_run(self, start, last_position, direction=1, group_id=None):
+        # Start (chunk, position, group id) of the next or previous run of grouped messages
+        # after start, skipping the run start itself belongs to. A run is a stretch of
+        # adjacent messages in the same group, see adjacent(). With group_id, only that
+        # group's runs count.
+        current = self.group_at(*start)
+        if group_id is not None and current != group_id:
+            current = None
+        op, order = (">", "ASC") if direction > 0 else ("<", "DESC")
+        sql = f"SELECT chunk, position, group_id FROM current_positions WHERE (chunk, position) {op} (?, ?)"
+        params = list(start)
+        if group_id is not None:
+            sql += " AND group_id = ?"
+            params.append(group_id)
+        sql += f" ORDER BY chunk {order}, position {order}"
+
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            try:
+                prev = tuple(start)
+                found = None
+                for chunk, position, gid in cursor:
+                    pos = (chunk, position)
+                    if current is not None:
+                        # still inside the run we started in
+                        if gid == current and (adjacent(prev, pos, last_position) if direction > 0
+                                            else adjacent(pos, prev, last_position)):
+                            prev = pos
+                            continue
+                        current = None
+                    if direction > 0:
+                        return chunk, position, gid
+                    # going back: walk to the first message of the run we landed in
+                    if found is None or (gid == found[2] and adjacent(pos, found[:2], last_position)):
+                        found = (chunk, position, gid)
+                        continue
+                    break
+                return found
+            finally:
+                cursor.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def drop_pending(db_path, workspace_ids):
+    # unsaved changes of workspaces that no longer exist
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            for table in ("pending", "pending_groups"):
+                conn.executemany(f"DELETE FROM {table} WHERE workspace = ?", [(w,) for w in workspace_ids])
+    except sqlite3.OperationalError:
+        pass  # an index from before the pending tables
+    finally:
+        conn.close()
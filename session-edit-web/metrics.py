@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Prometheus default buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_histograms = {}  # (route, phase) -> [bucket counts..., count, sum]
+_counters = {}    # (name, route, extra label) -> value
+_local = threading.local()  # route and spans of a request served outside Flask (see collect)
+
+
+def _route():
+    if has_request_context():
+        return request.endpoint or "unknown"
+    return getattr(_local, "route", None) or "none"
+
+
+def observe(route, phase, seconds):
+    with _lock:
+        h = _histograms.get((route, phase))
+        if h is None:
+            h = _histograms[(route, phase)] = [0] * (len(BUCKETS) + 2)
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                h[i] += 1
+        h[-2] += 1
+        h[-1] += seconds
+
+
+def count(name, value, route=None, label=None):
+    key = (name, route or _route(), label)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def add_read(n):
+    count("disk_read_bytes", n)
+
+
+def add_write(n):
+    count("disk_write_bytes", n)
+
+
+@contextmanager
+def span(phase):
+    # Times one phase of the current request. Repeated spans of the same phase add up
+    # and are recorded once per request (see init_app), so loops over chunks stay cheap.
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if has_request_context():
+            spans = g.setdefault("spans", {})
+            spans[phase] = spans.get(phase, 0.0) + elapsed
+        elif getattr(_local, "spans", None) is not None:
+            _local.spans[phase] = _local.spans.get(phase, 0.0) + elapsed
+        else:
+            observe(_route(), phase, elapsed)
+
+
+@contextmanager
+def collect(route, spans):
+    # For work done outside a Flask request (asgi.py runs it on pool threads):
+    # spans and byte counters go to route, spans into the given dict for record()
+    _local.route, _local.spans = route, spans
+    try:
+        yield spans
+    finally:
+        _local.route = _local.spans = None
+
+
+def record(route, spans, total, status, length=None):
+    for phase, elapsed in spans.items():
+        observe(route, phase, elapsed)
+    observe(route, "total", total)
+    count("requests", 1, route, str(status))
+    if length is not None:
+        count("response_bytes", length, route)
+
+
+def timing_header(spans, total):
+    timings = [f"{phase};dur={elapsed * 1000:.2f}" for phase, elapsed in spans.items()]
+    timings.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(timings)
+
+
+def render():
+    lines = [
+        "# HELP editor_phase_seconds Time spent in each phase of a route.",
+        "# TYPE editor_phase_seconds histogram",
+    ]
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    for (route, phase), h in sorted(histograms.items()):
+        labels = f'route="{route}",phase="{phase}"'
+        for le, n in zip(BUCKETS, h):
+            lines.append(f'editor_phase_seconds_bucket{{{labels},le="{le}"}} {n}')
+        lines.append(f'editor_phase_seconds_bucket{{{labels},le="+Inf"}} {h[-2]}')
+        lines.append(f"editor_phase_seconds_sum{{{labels}}} {h[-1]:.6f}")
+        lines.append(f"editor_phase_seconds_count{{{labels}}} {h[-2]}")
+
+    described = set()
+    for (name, route, label), value in sorted(counters.items(), key=lambda kv: (kv[0][0], kv[0][1], str(kv[0][2]))):
+        metric = f"editor_{name}_total"
+        if metric not in described:
+            lines.append(f"# TYPE {metric} counter")
+            described.add(metric)
+        labels = f'route="{route}"'
+        if label is not None:
+            labels += f',status="{label}"'
+        lines.append(f"{metric}{{{labels}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    # Counters are per process: with several gunicorn workers, each one reports its own
+    app.config.setdefault("SERVER_TIMING", os.environ.get("SERVER_TIMING", "") not in ("", "0"))
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        if request.endpoint == "metrics":
+            return response
+        total = time.perf_counter() - g.get("request_start", time.perf_counter())
+        spans = g.get("spans", {})
+        record(_route(), spans, total, response.status_code, response.content_length)
+        if app.config["SERVER_TIMING"]:
+            response.headers["Server-Timing"] = timing_header(spans, total)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
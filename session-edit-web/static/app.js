@@ -6,7 +6,6 @@ let state = {
   data: null,
   showDisplayNames: false,
   fileCount: 0,
-  imagesReloadKey: Date.now(),
 };
 
 let markMode = false;
@@ -63,14 +62,53 @@ function randomLightColor() {
   return `rgb(${r},${g},${b})`;
 }
 
+// Jump to the next/previous run of the group the visible message belongs to
 function jumpToDivider(direction) {
-  const keys = groups.flatMap(g => [g.start, g.end]);
-  const currentPos = getCurrentVisibleMessageKey();
-  const idx = keys.indexOf(currentPos);
-  if (idx >= 0) {
-    const target = keys[idx + direction];
-    if (target) scrollToMessage(target);
+  const key = getCurrentVisibleMessageKey();
+  const groupNum = key ? groupAssignments.get(key) : undefined;
+  navigateGroup(direction, groupNum ?? null);
+}
+
+// first message at least partly visible in the canvas, as "idx:mi"
+function getCurrentVisibleMessageKey() {
+  const top = canvas.getBoundingClientRect().top;
+  const children = Array.from(canvas.children);
+  const i = children.findIndex(el => el.getBoundingClientRect().bottom > top);
+  return i >= 0 ? `${state.chunkIndex}:${i}` : null;
+}
+
+function scrollToMessage(key) {
+  const [idx, mi] = key.split(":").map(Number);
+  if (idx !== state.chunkIndex) return;
+  const el = canvas.children[mi];
+  if (el) el.scrollIntoView({block: "start"});
+}
+
+// load the chunk holding key (through /navigate goto) if needed, then scroll to the message
+async function jumpToPosition(key) {
+  const idx = Number(key.split(":")[0]);
+  if (idx !== state.chunkIndex) {
+    const res = await fetch('/navigate', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({direction: 'goto', index: idx})});
+    if(!res.ok){ const e = await res.json().catch(()=>({error:'nav failed'})); alert(e.error||'navigate failed'); return }
+    const j = await res.json();
+    state.chunkIndex = j.chunk_index;
+    state.fileCount = j.file_count || state.fileCount;
+    state.data = j.data;
+    renderChunk(state.data);
   }
+  scrollToMessage(key);
+}
+
+// tell the server-side group index about assignment changes (see /groups/assign)
+function syncGroups(payload) {
+  fetch('/groups/assign', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)})
+    .catch(e => console.warn('group sync failed', e));
+}
+
+function groupPayload(groupNum) {
+  const g = {id: groupNum, color: groupColors[groupNum]};
+  if (groupNames[groupNum]) g.name = groupNames[groupNum];
+  return g;
 }
 
 
@@ -89,6 +127,7 @@ function renderChunk(data) {
   }
 
   const messages = data.messages;
+  const pendingImages = new Map(); // attachment id -> <img> elements waiting for it
 
   // restore per-chunk marks and groups
   messages.forEach((msg, i) => {
@@ -158,14 +197,15 @@ function renderChunk(data) {
         if (!ref) return;
         // strip db:// or attachments/ prefixes if present
         let id = ref.replace(/^db:\/\//, "");
-        if (id.startsWith("attachments/")) id = id.split("/", 1)[1] || id; // take last segment if prefixed
-        const url = "/attachment/" + encodeURIComponent(id) + "?v=" + state.imagesReloadKey;
+        if (id.startsWith("attachments/")) id = id.slice("attachments/".length); // take last segment if prefixed
         const img = document.createElement("img");
         img.style.maxWidth = "300px";
         img.style.display = "block";
         img.style.marginTop = "6px";
-        img.src = url;
         img.onerror = () => { img.style.display = "none"; };
+        // src is filled in by loadAttachments, one request for the whole chunk
+        if (!pendingImages.has(id)) pendingImages.set(id, []);
+        pendingImages.get(id).push(img);
         acont.appendChild(img);
       });
       contentEl.appendChild(acont);
@@ -219,6 +259,8 @@ function renderChunk(data) {
           groupColors[groupNum] = color;
           if (inputName) groupNames[groupNum] = inputName;
 
+          syncGroups({assign: {group: groupPayload(groupNum), start: pendingDivider, end: key}});
+
           const [cidx1, mi1] = pendingDivider.split(":").map(Number);
           const [cidx2, mi2] = key.split(":").map(Number);
           // support cross-chunk by assigning each message key explicitly
@@ -273,6 +315,7 @@ function renderChunk(data) {
 
         // Remove divider assignment from this element
         groupAssignments.delete(key);
+        syncGroups({unassign: [key]});
         el.style.borderLeft = "";
         el.removeAttribute("data-group");
         ev.preventDefault();
@@ -285,9 +328,16 @@ function renderChunk(data) {
       }
     });
 
+    // double click -> fetch the full message (embeds, reactions...) on demand
+    el.addEventListener("dblclick", (ev) => {
+      if (markMode || dividerMode) return;
+      toggleMessageDetails(el, state.chunkIndex, i);
+      ev.preventDefault();
+    });
 
     canvas.appendChild(el);
   });
+  loadAttachments(pendingImages);
 
   // Show which JSON filename is loaded in console (helpful)
   try {
@@ -300,6 +350,18 @@ function renderChunk(data) {
   updateBottomBar();
 }
 
+async function toggleMessageDetails(el, idx, mi) {
+  const existing = el.querySelector(".msg-details");
+  if (existing) { existing.remove(); return; }
+  const res = await fetch(`/message/${idx}/${mi}`);
+  if (!res.ok) { const e = await res.json().catch(() => ({error: "load failed"})); alert(e.error || "Failed to load message"); return; }
+  const msg = await res.json();
+  const pre = document.createElement("pre");
+  pre.className = "msg-details";
+  pre.textContent = JSON.stringify(msg, null, 2);
+  (el.querySelector(".msg-content") || el).appendChild(pre);
+}
+
 function handleGroupOption(option) {
   if (option === "Next group") {
     navigateGroup(1);
@@ -313,40 +375,118 @@ function handleGroupOption(option) {
   }
 }
 
-function navigateGroup(direction) {
-  if (!groups.length) return;
-  const current = state.chunkIndex;
-  let targetGroup = null;
-
-  if (direction > 0) {
-    targetGroup = groups.find(g => g.start > current);
-  } else {
-    const reversed = [...groups].reverse();
-    targetGroup = reversed.find(g => g.start < current);
-  }
-  if (targetGroup) {
-    state.chunkIndex = targetGroup.start;
-    renderChunk(state.data);
-  }
+// Next/previous group run anywhere in the archive (or only runs of groupNum), via the server's group index
+async function navigateGroup(direction, groupNum = null) {
+  if(!state.loaded){ alert('No file loaded'); return }
+  const from = getCurrentVisibleMessageKey() || `${state.chunkIndex}:-1`;
+  const params = new URLSearchParams({from, direction: direction > 0 ? 'next' : 'prev'});
+  if (groupNum !== null) params.set('group', groupNum);
+  const res = await fetch('/groups/next?' + params);
+  if(!res.ok){ const e = await res.json().catch(()=>({error:'group lookup failed'})); alert(e.error||'group lookup failed'); return }
+  const j = await res.json();
+  if (!j.position) { alert(direction > 0 ? 'No further group' : 'No earlier group'); return; }
+  if (j.group) rememberGroup(j.group);
+  await jumpToPosition(j.position);
 }
 
-function goToGroupByName(name) {
-  const entry = Object.entries(groupNames).find(([id, n]) => n === name);
-  if (!entry) {
+async function goToGroupByName(name) {
+  const res = await fetch('/groups');
+  if(!res.ok){ const e = await res.json().catch(()=>({error:'group lookup failed'})); alert(e.error||'group lookup failed'); return }
+  const list = (await res.json()).groups || [];
+  list.forEach(rememberGroup);
+  const group = list.find(g => g.name === name);
+  if (!group) {
     alert("Group not found: " + name);
     return;
   }
-  const groupId = entry[0];
-  const group = groups.find(g => g.group === parseInt(groupId));
-  if (group) {
-    state.chunkIndex = group.start;
-    renderChunk(state.data);
-  }
+  // next occurrence after the visible message, wrapping round to the first one
+  const from = getCurrentVisibleMessageKey() || `${state.chunkIndex}:-1`;
+  const next = await fetch('/groups/next?' + new URLSearchParams({from, direction: 'next', group: group.id}));
+  const j = next.ok ? await next.json() : {};
+  await jumpToPosition(j.position || group.first);
+}
+
+// names/colors of groups outside the loaded chunk, so new groups don't reuse their ids
+function rememberGroup(g) {
+  if (g.color && !groupColors[g.id]) groupColors[g.id] = g.color;
+  if (g.name && !groupNames[g.id]) groupNames[g.id] = g.name;
 }
 
 
 
 
+// --- attachments: one POST /attachments per rendered chunk instead of a request per image
+let attachmentUrls = new Map(); // attachment id -> object URL, kept while the chunk uses it
+let attachmentBatch = 0;        // bumped per render so a slow earlier response is dropped
+
+async function loadAttachments(pending){
+  const batch = ++attachmentBatch;
+  for (const [id, url] of attachmentUrls) {
+    if (!pending.has(id)) { URL.revokeObjectURL(url); attachmentUrls.delete(id); }
+  }
+  const missing = [];
+  for (const [id, imgs] of pending) {
+    const url = attachmentUrls.get(id);
+    if (url) imgs.forEach(img => { img.src = url; });
+    else missing.push(id);
+  }
+  if (!missing.length) return;
+
+  const found = new Set();
+  try {
+    const res = await fetch('/attachments', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ids: missing})});
+    if (!res.ok) throw new Error('batch failed');
+    for await (const rec of readAttachmentStream(res.body)) {
+      if (batch !== attachmentBatch) return;
+      const url = URL.createObjectURL(new Blob([rec.data], {type: rec.mime_type}));
+      attachmentUrls.set(rec.id, url);
+      found.add(rec.id);
+      (pending.get(rec.id) || []).forEach(img => { img.src = url; });
+    }
+  } catch (e) {
+    console.warn('attachments:', e);
+  }
+  if (batch !== attachmentBatch) return;
+  missing.forEach(id => { if (!found.has(id)) pending.get(id).forEach(img => { img.style.display = "none"; }); });
+}
+
+// Records of /attachments: 4-byte big-endian header length, JSON header {id, mime_type, file_name, size}, data
+async function* readAttachmentStream(body){
+  const reader = body.getReader();
+  let pieces = [], buffered = 0;
+  async function take(n){
+    while (buffered < n) {
+      const {done, value} = await reader.read();
+      if (done) return null;
+      pieces.push(value);
+      buffered += value.length;
+    }
+    let all = pieces[0] || new Uint8Array(0);
+    if (pieces.length > 1) {
+      all = new Uint8Array(buffered);
+      let off = 0;
+      for (const p of pieces) { all.set(p, off); off += p.length; }
+    }
+    pieces = all.length > n ? [all.subarray(n)] : [];
+    buffered -= n;
+    return all.subarray(0, n);
+  }
+  try {
+    while (true) {
+      const prefix = await take(4);
+      if (!prefix) return;
+      const headerBytes = await take(new DataView(prefix.buffer, prefix.byteOffset, 4).getUint32(0));
+      if (!headerBytes) throw new Error('truncated attachment stream');
+      const header = JSON.parse(new TextDecoder().decode(headerBytes));
+      header.data = await take(header.size);
+      if (!header.data) throw new Error('truncated attachment stream');
+      yield header;
+    }
+  } finally {
+    reader.cancel().catch(() => {});
+  }
+}
+
 // --- helper: safe attachment ref (handles string or object attachments)
 function attachmentRef(att){
   if(!att) return "";
@@ -383,9 +523,8 @@ function setLastJsonFilesList(list){
 
 // Networking
 async function doUploadFile(file){
-  const fd = new FormData();
-  fd.append('file', file);
-  const res = await fetch('/upload', {method:'POST', body:fd});
+  // raw body: the server streams it to disk without multipart parsing
+  const res = await fetch('/upload?name=' + encodeURIComponent(file.name), {method:'POST', headers:{'Content-Type':'application/zip'}, body:file});
   if(!res.ok){
     const err = await res.json().catch(()=>({error:'upload failed'}));
     alert('Upload error: ' + (err.error || 'unknown'));
@@ -409,7 +548,8 @@ async function navigate(direction){
   state.chunkIndex = j.chunk_index;
   state.fileCount = j.file_count || state.fileCount;
   state.data = j.data;
-  setLastJsonFilesList(j.json_files || null);
+  // the file list only comes with upload/load_recent; navigation keeps it
+  if (j.json_files) setLastJsonFilesList(j.json_files);
   renderChunk(state.data);
 }
 
@@ -421,7 +561,6 @@ async function reloadChunk(){
   state.chunkIndex = j.chunk_index;
   state.fileCount = j.file_count || state.fileCount;
   state.data = j.data;
-  setLastJsonFilesList(data.json_files || null);
   renderChunk(state.data);
 }
 
@@ -506,7 +645,8 @@ if (exportBtn) {
 
 
 function reloadImages(){
-  state.imagesReloadKey = Date.now();
+  attachmentUrls.forEach(url => URL.revokeObjectURL(url));
+  attachmentUrls.clear();
   if(state.data) renderChunk(state.data);
 }
 
@@ -676,6 +816,10 @@ function removeGroup(id) {
   if (!groups) groups = []; // make sure it's defined
   groups = groups.filter(g => g.group !== id);
   if (groupNames) delete groupNames[id];
+  for (const [key, groupNum] of groupAssignments) {
+    if (groupNum === id) groupAssignments.delete(key);
+  }
+  syncGroups({remove_group: id});
   renderChunk(state.data);
 }
 
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from groups import GroupIndex
+
+NINE = {"id": 9, "name": "nine"}
+TEN = {"id": 10, "name": "ten"}
+
+
+class NextRunTest(unittest.TestCase):
+    # two chunks of 5 messages each
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = GroupIndex(os.path.join(self.tmp.name, "groups.db"), "a")
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def next_run(self, start, direction=1, group_id=None):
+        return self.index.next_run(start, lambda chunk: 4, direction, group_id)
+
+    def test_run_does_not_continue_from_middle_of_chunk(self):
+        self.index.replace_chunk(0, [(1, NINE)])
+        self.index.replace_chunk(1, [(0, NINE)])
+        self.assertEqual(self.next_run((0, 1), group_id=9), (1, 0, 9))
+        self.assertEqual(self.next_run((1, 0), -1, group_id=9), (0, 1, 9))
+
+    def test_run_continues_across_chunk_boundary(self):
+        self.index.replace_chunk(0, [(3, NINE), (4, NINE)])
+        self.index.replace_chunk(1, [(0, NINE), (1, NINE), (3, TEN)])
+        self.assertEqual(self.next_run((0, 3)), (1, 3, 10))
+        self.assertIsNone(self.next_run((0, 3), group_id=9))
+        self.assertEqual(self.next_run((1, 3), -1), (0, 3, 9))
+
+    def test_unsaved_assignments_stay_with_their_index(self):
+        self.index.replace_chunk(0, [(1, NINE)])
+        self.index.assign([(0, 3)], TEN)
+        other = GroupIndex(os.path.join(self.tmp.name, "groups.db"), "b")
+        same = GroupIndex(os.path.join(self.tmp.name, "groups.db"), "a")
+        try:
+            self.assertEqual([g["id"] for g in self.index.groups()], [9, 10])
+            self.assertEqual([g["id"] for g in other.groups()], [9])
+            # another worker's connection for the same workspace
+            self.assertEqual([g["id"] for g in same.groups()], [9, 10])
+        finally:
+            other.close()
+            same.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
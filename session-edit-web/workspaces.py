@@ -0,0 +1,157 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# How many workspaces keep their DB handle and caches in memory per process
+MAX_OPEN = 64
+# How many chunk indexes each workspace keeps parsed in memory
+INDEX_CACHE_SIZE = 8
+# Workspaces not touched for this long are dropped from the backing DB
+MAX_AGE = 30 * 24 * 3600
+
+
+class Workspace:
+    # One loaded archive: its chunk list (sorted once), the open attachments DB and caches.
+    # current_index lives in the registry DB so every worker process sees the same value.
+
+    def __init__(self, registry, workspace_id, extract_path, json_files):
+        self.registry = registry
+        self.id = workspace_id
+        self.extract_path = extract_path
+        self.json_files = json_files
+        self.lock = threading.Lock()
+        self.index_cache = OrderedDict()
+        self._db = None
+        self.groups = None  # GroupIndex, opened on first use (see app.group_index)
+
+    @property
+    def file_count(self):
+        return len(self.json_files)
+
+    @property
+    def current_index(self):
+        return self.registry.get_index(self.id)
+
+    @current_index.setter
+    def current_index(self, idx):
+        self.registry.set_index(self.id, idx)
+
+    def attachments_db(self):
+        # one read-only connection per workspace, shared by requests; call with self.lock held
+        if self._db is None:
+            db_path = os.path.join(self.extract_path, "packed_images.db")
+            self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        return self._db
+
+    def cached_index(self, fname, stamp):
+        with self.lock:
+            entry = self.index_cache.get(fname)
+            if entry is None or entry[0] != stamp:
+                return None
+            self.index_cache.move_to_end(fname)
+            return entry[1]
+
+    def cache_index(self, fname, stamp, index):
+        with self.lock:
+            self.index_cache[fname] = (stamp, index)
+            self.index_cache.move_to_end(fname)
+            while len(self.index_cache) > INDEX_CACHE_SIZE:
+                self.index_cache.popitem(last=False)
+
+    def close(self):
+        with self.lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            if self.groups is not None:
+                self.groups.close()
+                self.groups = None
+            self.index_cache.clear()
+
+
+class WorkspaceRegistry:
+    # In-memory workspaces backed by an SQLite table, keyed by a short random id.
+    # The session cookie only carries that id.
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS workspaces (
+                id TEXT PRIMARY KEY,
+                extract_path TEXT,
+                json_files TEXT,
+                current_index INTEGER,
+                updated REAL
+            )
+        ''')
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.open = OrderedDict()
+
+    def create(self, extract_path, json_files, reextracted=False):
+        workspace_id = secrets.token_urlsafe(8)
+        with self.lock:
+            self.conn.execute("INSERT INTO workspaces VALUES (?, ?, ?, 0, ?)",
+                              (workspace_id, extract_path, json.dumps(json_files), time.time()))
+            self.conn.commit()
+            # after a re-extraction, other workspaces on the folder hold handles on the old
+            # files; otherwise they are left alone with their unsaved group changes
+            stale = [ws for ws in self.open.values() if ws.extract_path == extract_path] if reextracted else []
+        for ws in stale:
+            ws.close()
+        return self._remember(Workspace(self, workspace_id, extract_path, json_files))
+
+    def get(self, workspace_id):
+        if not workspace_id:
+            return None
+        with self.lock:
+            ws = self.open.get(workspace_id)
+            if ws is not None:
+                self.open.move_to_end(workspace_id)
+                return ws
+            # created by another worker, or before a restart
+            row = self.conn.execute("SELECT extract_path, json_files FROM workspaces WHERE id = ?",
+                                    (workspace_id,)).fetchone()
+        if row is None or not os.path.isdir(row[0]):
+            return None
+        return self._remember(Workspace(self, workspace_id, row[0], json.loads(row[1])))
+
+    def get_index(self, workspace_id):
+        with self.lock:
+            row = self.conn.execute("SELECT current_index FROM workspaces WHERE id = ?",
+                                    (workspace_id,)).fetchone()
+        return row[0] if row else 0
+
+    def set_index(self, workspace_id, idx):
+        with self.lock:
+            self.conn.execute("UPDATE workspaces SET current_index = ?, updated = ? WHERE id = ?",
+                              (idx, time.time(), workspace_id))
+            self.conn.commit()
+
+    def prune(self, max_age=MAX_AGE):
+        # -> [(id, extract_path)] of the workspaces removed
+        with self.lock:
+            cutoff = time.time() - max_age
+            removed = self.conn.execute("SELECT id, extract_path FROM workspaces WHERE updated < ?",
+                                        (cutoff,)).fetchall()
+            self.conn.execute("DELETE FROM workspaces WHERE updated < ?", (cutoff,))
+            self.conn.commit()
+        return removed
+
+    def _remember(self, ws):
+        with self.lock:
+            existing = self.open.get(ws.id)
+            if existing is not None:
+                return existing
+            self.open[ws.id] = ws
+            evicted = []
+            while len(self.open) > MAX_OPEN:
+                evicted.append(self.open.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return ws
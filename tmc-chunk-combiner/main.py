@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
-import json
 import logging
 import sys
 import argparse
 import re
+import sqlite3
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List
@@ -14,6 +14,9 @@ except ImportError:
     print("Please install colorlog: pip install colorlog")
     sys.exit(1)
 
+from chunkstore import MessageStore
+from jsonio import dumps_json, loads_json
+
 # Setup logging with colors
 handler = colorlog.StreamHandler()
 handler.setFormatter(colorlog.ColoredFormatter(
@@ -48,8 +51,8 @@ def is_special_message(content: str) -> bool:
 def process_json_file(file_path: Path, special_only: bool) -> List[Dict[str, str]]:
     """Extract relevant fields from a JSON file's messages."""
     try:
-        with file_path.open("r", encoding="utf-8") as f:
-            data: Dict[str, Any] = json.load(f)
+        with file_path.open("rb") as f:
+            data: Dict[str, Any] = loads_json(f.read())
         messages: List[Dict[str, Any]] = data.get("messages", [])
 
         results = []
@@ -71,14 +74,28 @@ def process_json_file(file_path: Path, special_only: bool) -> List[Dict[str, str
         return []
 
 
-def combine_jsons(input_dir: Path, output_dir: Path, special_only: bool) -> None:
-    """Combine all .json files into one output file."""
-    all_messages: List[Dict[str, str]] = []
+def process_message_store(db_path: Path, special_only: bool) -> List[Dict[str, str]]:
+    """Read name/content pairs from a chunkstore messages.db instead of the JSON chunks."""
+    try:
+        store = MessageStore(db_path)
+        rows = [(row["author_name"], row["content"])
+                for row in store.query(columns=["author_name", "content"])]
+        store.close()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read {db_path}: {e}")
+        return []
 
-    for file_path in input_dir.glob("*.json"):
-        logger.info(f"Processing {file_path.name}")
-        all_messages.extend(process_json_file(file_path, special_only))
+    results = []
+    for name, content in rows:
+        content = content or ""
+        if special_only and not is_special_message(content):
+            continue
+        results.append({"name": name or "", "content": content})
+    return results
 
+
+def write_output(all_messages: List[Dict[str, str]], output_dir: Path) -> None:
+    """Write the combined messages to output/output-<date>.json."""
     if not all_messages:
         logger.warning("No messages found. Nothing to write.")
         return
@@ -88,13 +105,30 @@ def combine_jsons(input_dir: Path, output_dir: Path, special_only: bool) -> None
     output_file = output_dir / f"output-{date_str}.json"
 
     try:
-        with output_file.open("w", encoding="utf-8") as f:
-            json.dump(all_messages, f, indent=2, ensure_ascii=False)
+        with output_file.open("wb") as f:
+            f.write(dumps_json(all_messages, indent=2, ensure_ascii=False))
         logger.info(f"Combined JSON written to {output_file}")
     except Exception as e:
         logger.error(f"Failed to write output file: {e}")
 
 
+def combine_jsons(input_dir: Path, output_dir: Path, special_only: bool) -> None:
+    """Combine all .json files into one output file."""
+    all_messages: List[Dict[str, str]] = []
+
+    for file_path in input_dir.glob("*.json"):
+        logger.info(f"Processing {file_path.name}")
+        all_messages.extend(process_json_file(file_path, special_only))
+
+    write_output(all_messages, output_dir)
+
+
+def combine_store(db_path: Path, output_dir: Path, special_only: bool) -> None:
+    """Combine all messages from a messages.db into one output file."""
+    logger.info(f"Reading {db_path}")
+    write_output(process_message_store(db_path, special_only), output_dir)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Combine JSON message files.")
     parser.add_argument(
@@ -102,11 +136,24 @@ if __name__ == "__main__":
         action="store_true",
         help="Keep only messages that start with '>' or are enclosed in quotes"
     )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        help="Read messages from a chunkstore messages.db instead of seschunk/"
+    )
     args = parser.parse_args()
 
-    input_dir = Path("seschunk")
     output_dir = Path("output")
 
+    if args.store:
+        if not args.store.exists():
+            logger.critical(f"Message store {args.store} does not exist.")
+            sys.exit(1)
+        combine_store(args.store, output_dir, args.special)
+        sys.exit(0)
+
+    input_dir = Path("seschunk")
+
     if not input_dir.exists():
         logger.critical(f"Input directory {input_dir} does not exist.")
         sys.exit(1)